@@ -0,0 +1,43 @@
+"""add query job table
+
+Revision ID: 3f9a1c2d7b10
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2d7b10'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'queryjob',
+        sa.Column('id', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False),
+        sa.Column('prompt', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('latency_budget', sa.Float(), nullable=True),
+        sa.Column('status', sqlmodel.sql.sqltypes.AutoString(length=16), nullable=False),
+        sa.Column('result_id', sa.Integer(), nullable=True),
+        sa.Column('error', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column('createdAt', sa.DateTime(), nullable=False),
+        sa.Column('updatedAt', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['result_id'], ['promptresult.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_queryjob_status'), 'queryjob', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_queryjob_status'), table_name='queryjob')
+    op.drop_table('queryjob')
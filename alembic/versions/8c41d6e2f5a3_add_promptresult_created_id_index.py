@@ -0,0 +1,27 @@
+"""add promptresult (createdAt, id) index
+
+Revision ID: 8c41d6e2f5a3
+Revises: 3f9a1c2d7b10
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41d6e2f5a3'
+down_revision: Union[str, Sequence[str], None] = '3f9a1c2d7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_promptresult_createdAt_id', 'promptresult', ['createdAt', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_promptresult_createdAt_id', table_name='promptresult')
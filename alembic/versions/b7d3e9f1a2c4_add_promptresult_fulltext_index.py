@@ -0,0 +1,54 @@
+"""add promptresult full-text index
+
+Revision ID: b7d3e9f1a2c4
+Revises: 8c41d6e2f5a3
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3e9f1a2c4'
+down_revision: Union[str, Sequence[str], None] = '8c41d6e2f5a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SQL Server only, and only when Full-Text Search is installed; /api/search
+    # falls back to the in-process index otherwise. Full-text DDL cannot run
+    # inside a transaction.
+    if op.get_bind().dialect.name != "mssql":
+        return
+    with op.get_context().autocommit_block():
+        op.execute("""
+            IF FULLTEXTSERVICEPROPERTY('IsFullTextInstalled') = 1
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM sys.fulltext_catalogs WHERE name = 'PromptResultCatalog')
+                    CREATE FULLTEXT CATALOG PromptResultCatalog;
+
+                DECLARE @pk sysname = (
+                    SELECT name FROM sys.indexes
+                    WHERE object_id = OBJECT_ID('promptresult') AND is_primary_key = 1
+                );
+                EXEC('CREATE FULLTEXT INDEX ON promptresult (prompt, results) KEY INDEX '
+                     + QUOTENAME(@pk) + ' ON PromptResultCatalog WITH CHANGE_TRACKING AUTO');
+            END
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "mssql":
+        return
+    with op.get_context().autocommit_block():
+        op.execute("""
+            IF EXISTS (SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('promptresult'))
+                DROP FULLTEXT INDEX ON promptresult;
+            IF EXISTS (SELECT 1 FROM sys.fulltext_catalogs WHERE name = 'PromptResultCatalog')
+                DROP FULLTEXT CATALOG PromptResultCatalog;
+        """)
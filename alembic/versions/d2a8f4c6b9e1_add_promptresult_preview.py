@@ -0,0 +1,58 @@
+"""add promptresult preview
+
+Revision ID: d2a8f4c6b9e1
+Revises: b7d3e9f1a2c4
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a8f4c6b9e1'
+down_revision: Union[str, Sequence[str], None] = 'b7d3e9f1a2c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _preview(text: str, length: int = 200) -> str:
+    # Same as db.types.make_preview at the time of this revision
+    flat = re.sub(r"\s+", " ", text or "").strip()
+    return flat if len(flat) <= length else flat[: length - 1].rstrip() + "…"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('promptresult', sa.Column('preview', sqlmodel.sql.sqltypes.AutoString(length=300), nullable=True))
+
+    # Rows written so far are uncompressed. Previews are built in Python so
+    # they match what the app writes (whitespace collapsed, ellipsis).
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        result = bind.execute(
+            sa.text(
+                "SELECT id, results FROM promptresult "
+                "WHERE preview IS NULL AND id > :last_id ORDER BY id"
+            ),
+            {"last_id": last_id},
+        )
+        rows = result.fetchmany(500)
+        result.close()
+        if not rows:
+            break
+        bind.execute(
+            sa.text("UPDATE promptresult SET preview = :preview WHERE id = :id"),
+            [{"id": row_id, "preview": _preview(results)} for row_id, results in rows],
+        )
+        last_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('promptresult', 'preview')
@@ -0,0 +1,28 @@
+"""add promptresult sources_skipped
+
+Revision ID: e5b1c7d3f8a2
+Revises: d2a8f4c6b9e1
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b1c7d3f8a2'
+down_revision: Union[str, Sequence[str], None] = 'd2a8f4c6b9e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('promptresult', sa.Column('sources_skipped', sa.JSON(none_as_null=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('promptresult', 'sources_skipped')
@@ -1,8 +1,9 @@
-import requests
 import os
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv, find_dotenv
+import clients
 
 dotenv_path = find_dotenv(usecwd=True)
 #print("Dotenv found at:", dotenv_path)
@@ -15,9 +16,9 @@ id = "gd_m5mbdl081229ln6t4a"
 OpenAI_api_key = os.getenv("OPENAI_API_KEY")
 BRIGHTDATA_TOKEN = os.getenv("BRIGHTDATA_TOKEN")
 BRIGHTDATA_BASE = "https://api.brightdata.com/datasets"
-client = OpenAI(api_key=OpenAI_api_key)
+client = AsyncOpenAI(api_key=OpenAI_api_key, http_client=clients.llm_client)
 
-def get_dataset_id(dataset_name: str) -> str | None:
+async def get_dataset_id(dataset_name: str) -> str | None:
     # sourcery skip: inline-variable, move-assign-in-block, use-named-expression
     """
     Get Bright Data dataset ID (gd_xxx) by dataset name.
@@ -31,8 +32,11 @@ def get_dataset_id(dataset_name: str) -> str | None:
         "Authorization": f"Bearer {BRIGHTDATA_TOKEN}"
     }
 
+    if clients.client is None:
+        raise RuntimeError("HTTP client not initialized")
+
     try:
-        response = requests.get(url, headers=headers)
+        response = await clients.client.get(url, headers=headers)
         response.raise_for_status()
         datasets = response.json()
 
@@ -44,37 +48,37 @@ def get_dataset_id(dataset_name: str) -> str | None:
             ),
             None,
         )
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error fetching datasets: {e}")
         return None
 
 
-def get_brightdata_datasets():
+async def get_brightdata_datasets():
     
     dataset_name = "Booking"  # whatever you named it in Bright Data
 
-    if dataset_id := get_dataset_id(dataset_name):
+    if dataset_id := await get_dataset_id(dataset_name):
         print(f"Dataset ID for '{dataset_name}': {dataset_id}")
     else:
         print(f"Dataset '{dataset_name}' not found.")
         
     headers = {"Authorization": f"Bearer {BRIGHTDATA_TOKEN}", "Accept": "application/json"}
     try:      
-        resp = requests.get(f"{BRIGHTDATA_BASE}/{dataset_id}/snapshots", headers=headers, timeout=30)
+        resp = await clients.client.get(f"{BRIGHTDATA_BASE}/{dataset_id}/snapshots", headers=headers, timeout=30)  # type: ignore[union-attr]
         print("Status:", resp.status_code)
         print(resp.text)
         return resp.json()
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
-def run_agents(prompt: str) -> str:
+async def run_agents(prompt: str) -> str:
     try:
-        datasets = get_brightdata_datasets()
+        datasets = await get_brightdata_datasets()
 
         if datasets.status_code == 500:
             return JSONResponse(content={"error": datasets.body}, status_code=500)  # type: ignore
         # Ask GPT to analyze dataset names/descriptions against prompt
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an AI data analyst."},
@@ -1,19 +1,35 @@
 from dotenv import load_dotenv, find_dotenv
 
 import os
-from typing import Annotated, List
+import asyncio
+from typing import Annotated, AsyncIterator, Callable, List
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
+from langchain_core.runnables import RunnableConfig
 from langchain.chat_models import init_chat_model
 from typing_extensions import TypedDict
 from pydantic import BaseModel, Field
 from .web_operations import serp_search, reddit_search_api, reddit_post_retrieval
+from .llm_cache import CachedChatModel
+from .serp_merge import serp_merger
+from .token_budget import (
+    REDDIT_COMMENTS_TOKEN_BUDGET,
+    chunk_reddit_comments,
+    compact_reddit_comments,
+    count_message_tokens,
+    count_tokens,
+)
+import clients
+from cache import TTLCache
+from limits import get_limiter
 from .prompts import (
     get_reddit_analysis_messages, 
     get_google_analysis_messages,
     get_bing_analysis_messages,
     get_baidu_analysis_messages,
     get_reddit_url_analysis_messages,
+    get_reddit_chunk_summary_messages,
+    get_reddit_reduce_messages,
     get_synthesis_messages
 )
 
@@ -24,11 +40,39 @@ load_dotenv(find_dotenv(usecwd=True), override=True)
 #log("API KEY:", os.getenv("OPENAI_API_KEY"))
 api_key = os.getenv("OPENAI_API_KEY")
 
-llm = init_chat_model(
-    "gpt-4o",
-    model_provider="openai",
-    api_key=api_key,
+# Analysis and synthesis prompts are pure functions of the search results, so
+# identical prompts are answered from cache (LLM_CACHE_TTL=0 disables it).
+llm = CachedChatModel(
+    init_chat_model(
+        "gpt-4o",
+        model_provider="openai",
+        api_key=api_key,
+        http_async_client=clients.llm_client,
+    ),
+    TTLCache(
+        "llm",
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512")),
+        db_path=os.getenv("LLM_CACHE_DB"),
+    ),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "86400")),
+    limiter=get_limiter("openai"),
+)
+
+# Default per-request latency budget (seconds) for gathering the per-source
+# analyses. When it expires, synthesis runs on whatever is ready. 0 disables it.
+QUERY_LATENCY_BUDGET = float(os.getenv("QUERY_LATENCY_BUDGET", "120"))
+
+# Comment sets larger than REDDIT_MAP_REDUCE_MIN_TOKENS are summarized in
+# chunks of REDDIT_CHUNK_TOKENS per post, REDDIT_MAP_CONCURRENCY at a time (at
+# most REDDIT_MAP_MAX_CHUNKS chunks), before the Reddit analysis. 0 disables it.
+REDDIT_MAP_REDUCE_MIN_TOKENS = int(
+    os.getenv("REDDIT_MAP_REDUCE_MIN_TOKENS", str(REDDIT_COMMENTS_TOKEN_BUDGET))
 )
+REDDIT_CHUNK_TOKENS = int(os.getenv("REDDIT_CHUNK_TOKENS", "2000"))
+REDDIT_MAP_CONCURRENCY = int(os.getenv("REDDIT_MAP_CONCURRENCY", "4"))
+REDDIT_MAP_MAX_CHUNKS = int(os.getenv("REDDIT_MAP_MAX_CHUNKS", "16"))
+
+SOURCES = ["google", "bing", "baidu", "reddit"]
 
 # -----------------------------------------------
 #  Logging helper
@@ -37,6 +81,10 @@ def log(message: str) -> None:
     print(f"[AGENT SEARCH] {message}")
 
 
+def log_prompt_size(node: str, messages: list) -> None:
+    log(f"{node}: {count_message_tokens(messages)} prompt tokens")
+
+
 class State(TypedDict):
     messages: Annotated[list, add_messages]
     user_question: str | None
@@ -53,34 +101,83 @@ class State(TypedDict):
     final_answer: str | None
 
 
+class GoogleBranchOutput(TypedDict):
+    google_results: str | None
+    google_analysis: str | None
+
+
+class BingBranchOutput(TypedDict):
+    bing_results: str | None
+    bing_analysis: str | None
+
+
+class BaiduBranchOutput(TypedDict):
+    baidu_results: str | None
+    baidu_analysis: str | None
+
+
+class RedditBranchOutput(TypedDict):
+    reddit_results: str | None
+    selected_reddit_urls: list[str] | None
+    reddit_post_data: list | None
+    reddit_analysis: str | None
+
+
+class ChatbotResult(BaseModel):
+    answer: str
+    sources_included: List[str] = Field(default_factory=list)
+    sources_skipped: List[str] = Field(default_factory=list)
+
+
 class RedditURLAnalysis(BaseModel):
     selected_urls: List[str] = Field(description="List of Reddit URLs that contain valuable information for answering the user's question")
 
 
-async def google_search(state: State):
+async def google_search(state: State, config: RunnableConfig):
     user_question = state.get("user_question", "")
     log(f"Searching Google for: {user_question}")
 
     google_results = await serp_search(user_question, engine="google")
 
-    return {"google_results": google_results}
+    return {"google_results": claim_serp_results(config, "google", google_results)}
 
 
-async def bing_search(state: State):
+async def bing_search(state: State, config: RunnableConfig):
     user_question = state.get("user_question", "")
     log(f"Searching Bing for: {user_question}")
 
     bing_results = await serp_search(user_question, engine="bing")
 
-    return {"bing_results": bing_results}
+    return {"bing_results": claim_serp_results(config, "bing", bing_results)}
 
-async def baidu_search(state: State):
+async def baidu_search(state: State, config: RunnableConfig):
     user_question = state.get("user_question", "")
     log(f"Searching Baidu for: {user_question}")
 
     baidu_results = await serp_search(user_question, engine="baidu")
 
-    return {"baidu_results": baidu_results}
+    return {"baidu_results": claim_serp_results(config, "baidu", baidu_results)}
+
+
+def claim_serp_results(config: RunnableConfig, engine: str, results):
+    """
+    Drop the results another engine of this request ranked better.
+
+    Each SERP branch calls this as soon as its own search is done, against
+    the engines that finished before it, so no analysis waits for a slower
+    engine. Runs without a ``serp_claims`` session keep every result.
+    """
+    claims = (config.get("configurable") or {}).get("serp_claims")
+    if claims is None or not isinstance(results, dict):
+        return results
+
+    claimed, report = claims.claim(engine, results)
+    if report["duplicates_removed"]:
+        log(
+            f"{engine}: {report['duplicates_removed']} results already found by other engines, "
+            f"~{report['tokens_before']} -> ~{report['tokens_after']} prompt tokens"
+        )
+    return claimed
 
 
 async def reddit_search(state: State):
@@ -104,9 +201,11 @@ async def analyze_reddit_posts(state: State):
 
     structured_llm = llm.with_structured_output(RedditURLAnalysis)
     messages = get_reddit_url_analysis_messages(user_question, reddit_results) 
+    log_prompt_size("analyze_reddit_posts", messages)
 
     try:
-        analysis_raw = structured_llm.invoke(messages) 
+        async with get_limiter("openai"):
+            analysis_raw = await structured_llm.ainvoke(messages)
         analysis = RedditURLAnalysis.model_validate(analysis_raw)
         selected_urls = analysis.selected_urls 
 
@@ -149,7 +248,13 @@ async def analyze_google_results(state: State):
     user_question = state.get("user_question", "")
     google_results = state.get("google_results", "")
 
+    # Failed search or open circuit: leave the source out of the synthesis
+    if not google_results:
+        log("No google results, skipping analysis")
+        return {"google_analysis": None}
+
     messages = get_google_analysis_messages(user_question, google_results) 
+    log_prompt_size("analyze_google_results", messages)
     reply = await llm.ainvoke(messages)
 
     return {"google_analysis": reply.content}
@@ -161,7 +266,13 @@ async def analyze_bing_results(state: State):
     user_question = state.get("user_question", "")
     bing_results = state.get("bing_results", "")
 
+    # Failed search or open circuit: leave the source out of the synthesis
+    if not bing_results:
+        log("No bing results, skipping analysis")
+        return {"bing_analysis": None}
+
     messages = get_bing_analysis_messages(user_question, bing_results)
+    log_prompt_size("analyze_bing_results", messages)
     reply = await llm.ainvoke(messages)
 
     return {"bing_analysis": reply.content}
@@ -172,7 +283,13 @@ async def analyze_baidu_results(state: State):
     user_question = state.get("user_question", "")
     baidu_results = state.get("baidu_results", "")
 
+    # Failed search or open circuit: leave the source out of the synthesis
+    if not baidu_results:
+        log("No baidu results, skipping analysis")
+        return {"baidu_analysis": None}
+
     messages = get_baidu_analysis_messages(user_question, baidu_results) 
+    log_prompt_size("analyze_baidu_results", messages)
     reply = await llm.ainvoke(messages)
 
     return {"baidu_analysis": reply.content}
@@ -185,12 +302,64 @@ async def analyze_reddit_results(state: State):
     reddit_results = state.get("reddit_results", "")
     reddit_post_data = state.get("reddit_post_data", "")
 
+    # Too many comments for one prompt: summarize them per post first
+    if REDDIT_MAP_REDUCE_MIN_TOKENS and (
+        count_tokens(compact_reddit_comments(reddit_post_data, budget=None)) > REDDIT_MAP_REDUCE_MIN_TOKENS
+    ):
+        summaries = await summarize_reddit_comments(user_question, reddit_post_data)
+        if summaries:
+            messages = get_reddit_reduce_messages(user_question, reddit_results, summaries)
+            log_prompt_size("analyze_reddit_results", messages)
+            reply = await llm.ainvoke(messages)
+            return {"reddit_analysis": reply.content}
+
     messages = get_reddit_analysis_messages(user_question, reddit_results, reddit_post_data)
+    log_prompt_size("analyze_reddit_results", messages)
     reply = await llm.ainvoke(messages)
 
     return {"reddit_analysis": reply.content}
 
 
+async def summarize_reddit_comments(user_question, reddit_post_data) -> list[str]:
+    """
+    Map step of the Reddit analysis: one summary per chunk of comments.
+
+    Chunks are summarized concurrently, at most REDDIT_MAP_CONCURRENCY at a
+    time, so the wall-clock time grows with chunks / concurrency rather than
+    with the size of the comment set. Failed chunks are left out.
+    """
+    chunks = chunk_reddit_comments(reddit_post_data, REDDIT_CHUNK_TOKENS)
+    if len(chunks) > REDDIT_MAP_MAX_CHUNKS:
+        # Take every post's first chunk, then every post's second, ... so the
+        # cap trims long threads instead of dropping whole posts
+        seen: dict = {}
+        positions = []
+        for post_url, _ in chunks:
+            positions.append(seen.get(post_url, 0))
+            seen[post_url] = positions[-1] + 1
+        order = sorted(range(len(chunks)), key=lambda index: positions[index])
+        log(f"Summarizing {REDDIT_MAP_MAX_CHUNKS} of {len(chunks)} comment chunks")
+        chunks = [chunks[index] for index in order[:REDDIT_MAP_MAX_CHUNKS]]
+
+    semaphore = asyncio.Semaphore(max(1, REDDIT_MAP_CONCURRENCY))
+
+    async def summarize(post_url, comments):
+        messages = get_reddit_chunk_summary_messages(user_question, post_url, comments)
+        async with semaphore:
+            reply = await llm.ainvoke(messages)
+        return reply.content
+
+    replies = await asyncio.gather(
+        *(summarize(post_url, comments) for post_url, comments in chunks),
+        return_exceptions=True,
+    )
+    summaries = [reply for reply in replies if isinstance(reply, str) and reply]
+
+    failed = sum(1 for reply in replies if isinstance(reply, BaseException))
+    log(f"Summarized {len(chunks)} comment chunks, {REDDIT_MAP_CONCURRENCY} at a time ({failed} failed)")
+    return summaries
+
+
 async def synthesize_analyses(state: State):
     log("Combine all results together")
 
@@ -203,6 +372,7 @@ async def synthesize_analyses(state: State):
     messages = get_synthesis_messages(
         user_question, google_analysis, bing_analysis, baidu_analysis, reddit_analysis 
     )
+    log_prompt_size("synthesize_analyses", messages)
 
     reply = await llm.ainvoke(messages)
     final_answer = reply.content
@@ -210,49 +380,131 @@ async def synthesize_analyses(state: State):
     return {"final_answer": final_answer, "messages": [{"role": "assistant", "content": final_answer}]}
 
 
-graph_builder = StateGraph(State)
+def build_branch(output_schema, *steps):
+    """
+    Compile ``steps`` into a linear subgraph that exposes only ``output_schema``.
+
+    Each source runs as one of these branches so its analysis starts as soon
+    as its own search is done, instead of waiting for the slowest source in a
+    shared superstep. Restricting the output keeps parallel branches from
+    writing the same (non-reducer) state keys back to the parent graph.
+    """
+    branch_builder = StateGraph(State, output_schema=output_schema)
+
+    previous = START
+    for step in steps:
+        branch_builder.add_node(step.__name__, step)
+        branch_builder.add_edge(previous, step.__name__)
+        previous = step.__name__
+    branch_builder.add_edge(previous, END)
+
+    return branch_builder.compile()
+
+
+google_branch = build_branch(GoogleBranchOutput, google_search, analyze_google_results)
+bing_branch = build_branch(BingBranchOutput, bing_search, analyze_bing_results)
+baidu_branch = build_branch(BaiduBranchOutput, baidu_search, analyze_baidu_results)
+reddit_branch = build_branch(
+    RedditBranchOutput,
+    reddit_search,
+    analyze_reddit_posts,
+    retrieve_reddit_posts,
+    analyze_reddit_results,
+)
 
-graph_builder.add_node("google_search", google_search)
-graph_builder.add_node("bing_search", bing_search)
-graph_builder.add_node("baidu_search", baidu_search)
-graph_builder.add_node("reddit_search", reddit_search)
-graph_builder.add_node("analyze_reddit_posts", analyze_reddit_posts)
-graph_builder.add_node("retrieve_reddit_posts", retrieve_reddit_posts)
-graph_builder.add_node("analyze_google_results", analyze_google_results)
-graph_builder.add_node("analyze_bing_results", analyze_bing_results)
-graph_builder.add_node("analyze_baidu_results", analyze_baidu_results)
-graph_builder.add_node("analyze_reddit_results", analyze_reddit_results)
-graph_builder.add_node("synthesize_analyses", synthesize_analyses)
+BRANCHES = ["google_branch", "bing_branch", "baidu_branch", "reddit_branch"]
 
-graph_builder.add_edge(START, "google_search")
-graph_builder.add_edge(START, "bing_search")
-graph_builder.add_edge(START, "baidu_search")
-graph_builder.add_edge(START, "reddit_search")
+# Synthesis on its own, for when the latency budget expires before the full
+# graph reaches it; running it as a graph keeps its tokens streamable.
+synthesis_graph = build_branch(State, synthesize_analyses)
 
-graph_builder.add_edge("google_search", "analyze_reddit_posts")
-graph_builder.add_edge("bing_search", "analyze_reddit_posts")
-graph_builder.add_edge("baidu_search", "analyze_reddit_posts")
-graph_builder.add_edge("reddit_search", "analyze_reddit_posts")
-graph_builder.add_edge("analyze_reddit_posts", "retrieve_reddit_posts")
+graph_builder = StateGraph(State)
+
+graph_builder.add_node("google_branch", google_branch)
+graph_builder.add_node("bing_branch", bing_branch)
+graph_builder.add_node("baidu_branch", baidu_branch)
+graph_builder.add_node("reddit_branch", reddit_branch)
+graph_builder.add_node("synthesize_analyses", synthesize_analyses)
 
-graph_builder.add_edge("retrieve_reddit_posts", "analyze_google_results")
-graph_builder.add_edge("retrieve_reddit_posts", "analyze_bing_results")
-graph_builder.add_edge("retrieve_reddit_posts", "analyze_baidu_results")
-graph_builder.add_edge("retrieve_reddit_posts", "analyze_reddit_results")
+graph_builder.add_edge(START, "google_branch")
+graph_builder.add_edge(START, "bing_branch")
+graph_builder.add_edge(START, "baidu_branch")
+graph_builder.add_edge(START, "reddit_branch")
 
-graph_builder.add_edge("analyze_google_results", "synthesize_analyses")
-graph_builder.add_edge("analyze_bing_results", "synthesize_analyses")
-graph_builder.add_edge("analyze_baidu_results", "synthesize_analyses")
-graph_builder.add_edge("analyze_reddit_results", "synthesize_analyses")
+# Wait for every branch before synthesizing
+graph_builder.add_edge(BRANCHES, "synthesize_analyses")
 
 graph_builder.add_edge("synthesize_analyses", END)
 
 graph = graph_builder.compile()
 
 
-async def run_chatbot(user_input):
+def _progress_event(namespace: tuple, mode: str, chunk) -> dict | None:
+    """Translate one ``tasks``/``messages`` stream item into a client event."""
+    if mode == "tasks":
+        # Node names carry their source (google_search, analyze_reddit_posts,
+        # reddit_branch)
+        name = chunk["name"]
+        source = next((s for s in SOURCES if s in name.split("_")), None)
+
+        if "result" not in chunk:
+            return {"event": "node_start", "node": name, "source": source}
+        error = chunk.get("error")
+        return {
+            "event": "node_end",
+            "node": name,
+            "source": source,
+            # A source is finished once its analysis (or its whole branch) is
+            "done": name in (f"analyze_{source}_results", f"{source}_branch"),
+            "error": str(error) if error else None,
+        }
+
+    if mode == "messages":
+        message, metadata = chunk
+        # Only the synthesized answer is streamed; per-source analyses are
+        # reported through node events.
+        if metadata.get("langgraph_node") == "synthesize_analyses" and message.content:
+            return {"event": "token", "content": message.content}
+
+    return None
+
+
+async def _updates(
+    compiled, state, on_event: Callable[[dict], None] | None, config: RunnableConfig | None = None
+):
+    """Yield the node updates of ``compiled``, reporting progress to ``on_event``."""
+    stream_mode = ["updates", "tasks", "messages"] if on_event else ["updates"]
+
+    async for namespace, mode, chunk in compiled.astream(
+        state, config, stream_mode=stream_mode, subgraphs=True
+    ):
+        if mode == "updates":
+            yield chunk
+        elif on_event is not None:
+            event = _progress_event(namespace, mode, chunk)
+            if event is not None:
+                on_event(event)
+
+
+async def run_chatbot(
+    user_input,
+    latency_budget: float | None = None,
+    on_event: Callable[[dict], None] | None = None,
+) -> ChatbotResult | None:
+    """
+    Run the research graph and return the synthesized answer.
+
+    ``latency_budget`` (seconds, defaults to QUERY_LATENCY_BUDGET) bounds the
+    time spent waiting for the per-source analyses. If it expires, the
+    remaining branches are cancelled and synthesis runs on the analyses that
+    are ready; the result records which sources made it in.
+
+    ``on_event``, when given, is called with a dict for every node start and
+    finish and for every token of the synthesized answer.
+    """
     log("Multi-Source Research Agent")
 
+    budget = QUERY_LATENCY_BUDGET if latency_budget is None else latency_budget
 
     #Cast the dict to the State type
     """     
@@ -293,10 +545,83 @@ async def run_chatbot(user_input):
 
     log("\nStarting parallel research process...")
     log("Launching Google, Bing, and Reddit searches...\n")
-    final_state = await graph.ainvoke(initial_state) 
+
+    final_state = dict(initial_state)
+    finished_branches = set()
+
+    # SERP results are deduplicated across engines as their searches finish
+    config: RunnableConfig = {"configurable": {"serp_claims": serp_merger.session()}}
+
+    try:
+        async with asyncio.timeout(budget or None) as deadline:
+            async for update in _updates(graph, initial_state, on_event, config):
+                # Inner-node updates arrive as each analysis finishes, so a
+                # timeout keeps every analysis that completed before it.
+                for node, values in update.items():
+                    final_state.update(values or {})
+                    if node in BRANCHES:
+                        finished_branches.add(node)
+
+                # All analyses are in: let synthesis finish without a deadline
+                if len(finished_branches) == len(BRANCHES):
+                    deadline.reschedule(None)
+
+    except TimeoutError:
+        log(f"Latency budget of {budget}s expired, synthesizing partial results")
+
+    sources_included = [s for s in SOURCES if final_state.get(f"{s}_analysis")]
+    sources_skipped = [s for s in SOURCES if s not in sources_included]
+
+    if not final_state.get("final_answer"):
+        for source in sources_skipped:
+            final_state[f"{source}_analysis"] = (
+                "Not available: this source did not respond within the time budget."
+            )
+        async for update in _updates(synthesis_graph, final_state, on_event):
+            for values in update.values():
+                final_state.update(values or {})
 
     if final_state.get("final_answer"):
         log(f"\nFinal Answer:\n{final_state.get('final_answer')}\n")
-        return final_state.get('final_answer')
+        log(f"Sources included: {sources_included}, skipped: {sources_skipped}")
+        return ChatbotResult(
+            answer=final_state["final_answer"],
+            sources_included=sources_included,
+            sources_skipped=sources_skipped,
+        )
     log("-" * 80)
 
+
+async def stream_chatbot(user_input, latency_budget: float | None = None) -> AsyncIterator[dict]:
+    """
+    ``run_chatbot`` as a stream of progress events.
+
+    Yields ``node_start``/``node_end`` as each node runs (``source`` names the
+    source it belongs to, ``done`` marks the end of that source's work),
+    ``token`` chunks of the synthesized answer, and a
+    final ``answer`` event carrying the ChatbotResult fields. Every event has
+    an ``elapsed`` time in seconds. Closing the iterator cancels the run.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    queue: asyncio.Queue[dict | None] = asyncio.Queue()
+
+    def emit(event: dict) -> None:
+        queue.put_nowait({**event, "elapsed": round(loop.time() - started, 3)})
+
+    run = asyncio.create_task(run_chatbot(user_input, latency_budget, on_event=emit))
+    run.add_done_callback(lambda _: queue.put_nowait(None))
+
+    try:
+        while (event := await queue.get()) is not None:
+            yield event
+
+        result = run.result()
+        if result is not None:
+            yield {
+                "event": "answer",
+                **result.model_dump(),
+                "elapsed": round(loop.time() - started, 3),
+            }
+    finally:
+        run.cancel()
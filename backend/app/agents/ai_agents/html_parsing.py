@@ -0,0 +1,124 @@
+import os
+import json
+import asyncio
+import contextlib
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, TypeVar
+from bs4 import BeautifulSoup, SoupStrainer
+
+T = TypeVar("T")
+
+
+# -----------------------------------------------
+#  Logging helper
+# -----------------------------------------------
+def log(message: str) -> None:
+    print(f"[HTML PARSING] {message}")
+
+
+# lxml's C parser is several times faster than the pure-Python html.parser
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# Worker processes for HTML parsing; 0 parses on the calling thread
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))
+
+# The app runs threads (DB pool, to_thread helpers), and forking a threaded
+# process can copy locks held mid-operation into the child. Workers come
+# from a forkserver (a clean, single-threaded process) where available.
+_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+_pool: Executor | None = None
+
+
+def _has_class(name: str) -> Callable[[Any], bool]:
+    # At parse time the class attribute is still the raw "a b c" string
+    def match(value: Any) -> bool:
+        if not value:
+            return False
+        classes = value.split() if isinstance(value, str) else value
+        return name in classes
+    return match
+
+
+# Only the pieces each extractor reads are built into a tree
+_BAIDU_RESULTS = SoupStrainer(class_=_has_class("result"))  # Baidu SERPs usually use .result class
+_PARAGRAPHS = SoupStrainer("p")
+
+
+def parse_baidu_html(html: str) -> List[Dict[str, Any]]:
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=_BAIDU_RESULTS)
+    results = []
+    for item in soup.select(".result"):
+        title_tag = item.select_one("h3 a")
+        if not title_tag:
+            continue
+        snippet_tag = item.select_one(".c-abstract")
+        results.append({
+            "title": title_tag.get_text(strip=True),
+            "url": title_tag.get("href"),
+            "snippet": snippet_tag.get_text(strip=True) if snippet_tag else ""
+        })
+    return results
+
+
+def parse_response_text(text: str) -> Dict[str, Any]:
+    """
+    Tries JSON parsing first.
+    If JSON fails, falls back to HTML parsing.
+    Always returns a dict.
+    """
+    # Try JSON
+    with contextlib.suppress(json.JSONDecodeError):
+        return json.loads(text)
+
+    # Try HTML
+    with contextlib.suppress(Exception):
+        soup = BeautifulSoup(text, HTML_PARSER, parse_only=_PARAGRAPHS)
+
+        # Example logic: extract text blocks or divs
+        paragraphs = [p.get_text(strip=True) for p in soup.find_all("p")]
+        return {"html_raw": text, "html_parsed": paragraphs}
+
+    # Fallback: empty dict
+    return {}
+
+
+async def run_parser(fn: Callable[..., T], *args: Any) -> T:
+    """
+    Run a parsing function in the worker pool so page-sized HTML does not
+    hold up the event loop. ``fn`` must be a module-level function.
+    """
+    if PARSE_WORKERS <= 0:
+        return fn(*args)
+    pool = start_parser_pool()
+    return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+
+def start_parser_pool() -> Executor:
+    """
+    Create the worker pool; called at startup, before the app starts other
+    threads, and lazily by ``run_parser`` otherwise.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=PARSE_WORKERS,
+            mp_context=multiprocessing.get_context(_START_METHOD),
+        )
+        log(f"Started {PARSE_WORKERS} parser processes ({HTML_PARSER}, {_START_METHOD})")
+    return _pool
+
+
+async def shutdown_parser_pool() -> None:
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        # Joining the worker processes blocks, so wait for them off the loop
+        await asyncio.to_thread(pool.shutdown, cancel_futures=True)
@@ -0,0 +1,72 @@
+import json
+import hashlib
+from typing import Any
+from langchain_core.messages import AIMessage
+from cache import TTLCache
+from limits import Limiter
+
+
+# -----------------------------------------------
+#  Logging helper
+# -----------------------------------------------
+def log(message: str) -> None:
+    print(f"[LLM CACHE] {message}")
+
+
+def _serialize(value: Any) -> Any:
+    """JSON fallback for LangChain message objects inside a message list."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+
+class CachedChatModel:
+    """
+    Chat model wrapper that serves repeated ``ainvoke`` calls from a cache.
+
+    The cache key is a SHA-256 of the model's identifying parameters, the
+    message list and any call kwargs, so the same prompt built from the same
+    search results is only billed once per TTL. Everything other than
+    ``ainvoke`` (``with_structured_output``, ``astream``, ...) is delegated to
+    the wrapped model unchanged.
+
+    Cache misses go through ``limiter``, when given, so only calls that
+    actually reach the provider count against its limits.
+    """
+
+    def __init__(self, llm: Any, cache: TTLCache, ttl: float, limiter: Limiter | None = None):
+        self._llm = llm
+        self._cache = cache
+        self._ttl = ttl
+        self._limiter = limiter
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._llm, name)
+
+    def cache_key(self, messages: Any, **kwargs: Any) -> str:
+        payload = {
+            "model": getattr(self._llm, "_identifying_params", {}),
+            "messages": messages,
+            "params": kwargs,
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=_serialize)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    async def ainvoke(self, messages: Any, config: Any = None, **kwargs: Any) -> Any:
+        key = self.cache_key(messages, **kwargs)
+
+        cached = await self._cache.get(key)
+        if cached is not None:
+            log(f"Hit {key[:12]}")
+            return AIMessage(content=cached)
+
+        if self._limiter is not None:
+            async with self._limiter:
+                reply = await self._llm.ainvoke(messages, config, **kwargs)
+        else:
+            reply = await self._llm.ainvoke(messages, config, **kwargs)
+        await self._cache.set(key, reply.content, self._ttl)
+        return reply
+
+    def stats(self) -> dict:
+        return self._cache.stats()
@@ -1,4 +1,11 @@
 from typing import Dict, Any
+from .token_budget import (
+    ANALYSIS_TOKEN_BUDGET,
+    compact_reddit_comments,
+    compact_reddit_posts,
+    compact_serp,
+    truncate,
+)
 
 
 class PromptTemplates:
@@ -109,7 +116,7 @@ Highlight both positive and negative experiences, controversies, and varying opi
 
     @staticmethod
     def reddit_analysis_user(
-        user_question: str, reddit_results: str, reddit_post_data: list
+        user_question: str, reddit_results: str, reddit_post_data: str
     ) -> str:
         """User prompt for analyzing Reddit discussions."""
         return f"""Question: {user_question}
@@ -118,6 +125,44 @@ Reddit Search Results: {reddit_results}
 
 Detailed Reddit Post Data: {reddit_post_data}
 
+Please analyze this Reddit content and extract community insights, user experiences, and relevant discussions."""
+
+    @staticmethod
+    def reddit_chunk_summary_system() -> str:
+        """System prompt for summarizing one chunk of Reddit comments."""
+        return """You are an expert at analyzing social media discussions. Summarize the provided Reddit comments, which all come from one post, as notes for a later analysis.
+
+Keep:
+- Experiences, opinions and advice that bear on the user's question
+- Points of agreement and disagreement between commenters
+- Up to three short, telling quotes (in quotation marks)
+
+Leave out anything unrelated to the question. Be brief: a few bullet points."""
+
+    @staticmethod
+    def reddit_chunk_summary_user(user_question: str, post_url: str, comments: str) -> str:
+        """User prompt for summarizing one chunk of Reddit comments."""
+        return f"""Question: {user_question}
+
+Post: {post_url}
+
+Comments:
+{comments}
+
+Please summarize what these comments contribute to answering the question."""
+
+    @staticmethod
+    def reddit_reduce_user(
+        user_question: str, reddit_results: str, chunk_summaries: str
+    ) -> str:
+        """User prompt for analyzing Reddit discussions from per-chunk summaries."""
+        return f"""Question: {user_question}
+
+Reddit Search Results: {reddit_results}
+
+Summaries of the Reddit comments, one per group of comments from the same post:
+{chunk_summaries}
+
 Please analyze this Reddit content and extract community insights, user experiences, and relevant discussions."""
 
     @staticmethod
@@ -174,54 +219,84 @@ def create_message_pair(system_prompt: str, user_prompt: str) -> list[Dict[str,
     ]
 
 
-# Convenience functions for creating complete message arrays
+# Convenience functions for creating complete message arrays. Search results
+# and comments are serialized compactly and fitted to per-source token budgets
+# (see token_budget.py) before they go into a prompt.
 def get_reddit_url_analysis_messages(
-    user_question: str | None, reddit_results: str | None
+    user_question: str | None, reddit_results: Any
 ) -> list[Dict[str, Any]]:
     """Get messages for Reddit URL analysis."""
     return create_message_pair(
         PromptTemplates.reddit_url_analysis_system(),
-        PromptTemplates.reddit_url_analysis_user(user_question or "", reddit_results or ""),
+        PromptTemplates.reddit_url_analysis_user(user_question or "", compact_reddit_posts(reddit_results)),
     )
 
 
 def get_google_analysis_messages(
-    user_question: str | None, google_results: str | None
+    user_question: str | None, google_results: Any
 ) -> list[Dict[str, Any]]:
     """Get messages for Google results analysis."""
     return create_message_pair(
         PromptTemplates.google_analysis_system(),
-        PromptTemplates.google_analysis_user(user_question or "", google_results or ""),
+        PromptTemplates.google_analysis_user(user_question or "", compact_serp(google_results)),
     )
 
 
 def get_bing_analysis_messages(
-    user_question: str | None, bing_results: str | None
+    user_question: str | None, bing_results: Any
 ) -> list[Dict[str, Any]]:
     """Get messages for Bing results analysis."""
     return create_message_pair(
         PromptTemplates.bing_analysis_system(),
-        PromptTemplates.bing_analysis_user(user_question or "", bing_results or ""),
+        PromptTemplates.bing_analysis_user(user_question or "", compact_serp(bing_results)),
     )
     
 def get_baidu_analysis_messages(
-    user_question: str | None, baidu_results: str | None
+    user_question: str | None, baidu_results: Any
 ) -> list[Dict[str, Any]]:
     """Get messages for Baidu results analysis."""
     return create_message_pair(
         PromptTemplates.baidu_analysis_system(),
-        PromptTemplates.baidu_analysis_user(user_question or "", baidu_results or ""),
+        PromptTemplates.baidu_analysis_user(user_question or "", compact_serp(baidu_results)),
     )
 
 
 def get_reddit_analysis_messages(
-    user_question:  str | None, reddit_results:  str | None , reddit_post_data: list | None
+    user_question:  str | None, reddit_results: Any, reddit_post_data: Any
 ) -> list[Dict[str, Any]]:
     """Get messages for Reddit discussions analysis."""
     return create_message_pair(
         PromptTemplates.reddit_analysis_system(),
         PromptTemplates.reddit_analysis_user(
-            user_question or "", reddit_results or "", reddit_post_data or []
+            user_question or "",
+            compact_reddit_posts(reddit_results),
+            compact_reddit_comments(reddit_post_data),
+        ),
+    )
+
+
+def get_reddit_chunk_summary_messages(
+    user_question: str | None, post_url: str | None, comments: str
+) -> list[Dict[str, Any]]:
+    """Get messages for summarizing one chunk of Reddit comments (map step)."""
+    return create_message_pair(
+        PromptTemplates.reddit_chunk_summary_system(),
+        PromptTemplates.reddit_chunk_summary_user(user_question or "", post_url or "unknown", comments),
+    )
+
+
+def get_reddit_reduce_messages(
+    user_question: str | None, reddit_results: Any, chunk_summaries: list[str]
+) -> list[Dict[str, Any]]:
+    """Get messages for the Reddit analysis built from chunk summaries (reduce step)."""
+    return create_message_pair(
+        PromptTemplates.reddit_analysis_system(),
+        PromptTemplates.reddit_reduce_user(
+            user_question or "",
+            compact_reddit_posts(reddit_results),
+            "\n\n".join(
+                truncate(summary, ANALYSIS_TOKEN_BUDGET // 2) for summary in chunk_summaries
+            ),
         ),
     )
 
@@ -238,6 +313,10 @@ def get_synthesis_messages(
     return create_message_pair(
         PromptTemplates.synthesis_system(),
         PromptTemplates.synthesis_user(
-            user_question or "", google_analysis or "", bing_analysis or "", baidu_analysis or "", reddit_analysis or ""
+            user_question or "",
+            *(
+                truncate(analysis or "", ANALYSIS_TOKEN_BUDGET)
+                for analysis in (google_analysis, bing_analysis, baidu_analysis, reddit_analysis)
+            ),
         ),
     )
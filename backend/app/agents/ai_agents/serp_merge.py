@@ -0,0 +1,136 @@
+from typing import Any, Dict, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from .token_budget import compact_serp, count_tokens
+
+
+# -----------------------------------------------
+#  Logging helper
+# -----------------------------------------------
+def log(message: str) -> None:
+    print(f"[SERP MERGE] {message}")
+
+
+# Query parameters that only track the click, never change the page
+_TRACKING_PARAMS = frozenset({
+    "gclid", "dclid", "fbclid", "msclkid", "yclid", "igshid", "srsltid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "ref", "ref_src", "spm",
+})
+
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form of ``url`` for deduplication: scheme and ``www.`` are
+    dropped, the host is lowercased, default ports, fragments, tracking
+    parameters and trailing slashes are removed and the query is sorted.
+    A URL that does not parse (e.g. ``http://x:abc/``) is returned as is.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        host = (parts.hostname or "").removeprefix("www.")
+        if parts.port and parts.port not in (80, 443):
+            host = f"{host}:{parts.port}"
+    except ValueError:
+        return url.strip()
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMS
+    )
+    return urlunsplit(("", host, parts.path.rstrip("/"), urlencode(query), "")).removeprefix("//")
+
+
+def _item_url(item: Dict[str, Any]) -> str | None:
+    # Google / Bing (brd_json) use "link", the Baidu extractor "url"
+    url = item.get("link") or item.get("url")
+    return url if isinstance(url, str) and url else None
+
+
+def _prompt_tokens(result: Dict[str, Any] | None) -> int:
+    # Size of the results as the analysis prompt renders them, before budgeting
+    return count_tokens(compact_serp(result, budget=None))
+
+
+class SerpClaims:
+    """
+    Cross-engine deduplication of organic SERP results for one request.
+
+    Each engine is deduplicated as soon as its search finishes, so no
+    analysis waits for another engine. A URL (by normalized form) belongs
+    to the engine that ranked it best, ties going to the earlier engine in
+    ``engines``: a finishing engine drops the URLs that an engine done
+    before it ranked better, and keeps the rest. Only an owner that
+    finishes later than a worse-ranked engine costs a duplicate; timing
+    never takes a URL away from its best-ranked engine. An engine's own
+    repeated URLs are dropped as well.
+    """
+
+    def __init__(self, merger: "SerpMerger", engines: Sequence[str]):
+        self.merger = merger
+        self.engines = list(engines)
+        self._claimed: Dict[str, tuple[int, int]] = {}  # normalized url -> (rank, engine order)
+
+    def _order(self, engine: str) -> int:
+        return self.engines.index(engine) if engine in self.engines else len(self.engines)
+
+    def claim(self, engine: str, result: Dict[str, Any] | None) -> tuple[Dict[str, Any] | None, dict]:
+        """Return ``(result without URLs already claimed, report)``."""
+        if not result:
+            return result, {"duplicates_removed": 0, "tokens_before": 0, "tokens_after": 0}
+
+        order = self._order(engine)
+        kept = []
+        seen = set()
+        duplicates = 0
+        for rank, item in enumerate(result.get("organic") or [], start=1):
+            url = _item_url(item)
+            if url is None:
+                kept.append(item)
+                continue
+            key = normalize_url(url)
+            if key in seen or self._claimed.get(key, (rank, order)) < (rank, order):
+                duplicates += 1
+                continue
+            seen.add(key)
+            self._claimed[key] = min(self._claimed.get(key, (rank, order)), (rank, order))
+            kept.append(item)
+
+        claimed = {**result, "organic": kept}
+        report = {
+            "duplicates_removed": duplicates,
+            "tokens_before": _prompt_tokens(result),
+            "tokens_after": _prompt_tokens(claimed),
+        }
+        self.merger.record(report)
+        return claimed, report
+
+
+class SerpMerger:
+    """Hands out a ``SerpClaims`` per request and totals what they removed."""
+
+    def __init__(self):
+        self._requests = 0
+        self._duplicates = 0
+        self._tokens_before = 0
+        self._tokens_after = 0
+
+    def session(self, engines: Sequence[str] = ("google", "bing", "baidu")) -> SerpClaims:
+        self._requests += 1
+        return SerpClaims(self, engines)
+
+    def record(self, report: dict) -> None:
+        self._duplicates += report["duplicates_removed"]
+        self._tokens_before += report["tokens_before"]
+        self._tokens_after += report["tokens_after"]
+
+    def stats(self) -> dict:
+        return {
+            "requests": self._requests,
+            "duplicates_removed": self._duplicates,
+            "tokens_before": self._tokens_before,
+            "tokens_after": self._tokens_after,
+            "tokens_saved": self._tokens_before - self._tokens_after,
+        }
+
+
+serp_merger = SerpMerger()
@@ -1,30 +1,72 @@
 import os
-import time
-import requests
+import json
+import asyncio
+import httpx
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
+import clients
+from limits import get_limiter
 
 load_dotenv()
 
+PROGRESS_URL = "https://api.brightdata.com/datasets/v3/progress/{snapshot_id}"
+DOWNLOAD_URL = "https://api.brightdata.com/datasets/v3/snapshot/{snapshot_id}"
 
-def poll_snapshot_status(
-    snapshot_id: str, max_attempts: int = 60, delay: int = 5
+# Snapshots can be large, so the download gets a longer read timeout than the
+# client default used for the small progress / trigger calls.
+DOWNLOAD_TIMEOUT = httpx.Timeout(connect=5, read=60, write=10, pool=5)
+
+# Default caps for streamed downloads; callers can override per call.
+SNAPSHOT_MAX_RECORDS = int(os.getenv("SNAPSHOT_MAX_RECORDS", "1000"))
+SNAPSHOT_MAX_BYTES = int(os.getenv("SNAPSHOT_MAX_BYTES", str(20 * 1024 * 1024)))
+
+
+def _get_client() -> httpx.AsyncClient:
+    if clients.client is None:
+        raise RuntimeError("HTTP client not initialized")
+    return clients.client
+
+
+def _auth_headers() -> Dict[str, str]:
+    return {"Authorization": f"Bearer {os.getenv('BRIGHTDATA_TOKEN')}"}
+
+
+# Progress checks and downloads share the dataset API's limits with triggers
+datasets_limiter = get_limiter("brightdata-datasets")
+
+
+async def fetch_snapshot_status(snapshot_id: str) -> str | None:
+    """Single progress check. Returns the Bright Data status string."""
+    client = _get_client()
+    progress_url = PROGRESS_URL.format(snapshot_id=snapshot_id)
+
+    async with datasets_limiter:
+        response = await client.get(progress_url, headers=_auth_headers())
+    response.raise_for_status()
+
+    return response.json().get("status")
+
+
+async def poll_snapshot_status(
+    snapshot_id: str, max_attempts: int = 60, delay: float = 5
 ) -> bool:
-    api_key = os.getenv("BRIGHTDATA_TOKEN")
-    progress_url = f"https://api.brightdata.com/datasets/v3/progress/{snapshot_id}"
-    headers = {"Authorization": f"Bearer {api_key}"}
+    """
+    Poll Bright Data until the snapshot is ready or failed.
 
+    Waits between attempts with ``asyncio.sleep`` so the event loop keeps
+    serving other requests. Cancellation (e.g. the caller's timeout) is not
+    caught here and propagates out of the current ``await``.
+
+    Used directly only when the shared ``SnapshotPoller`` is not running
+    (scripts, one-off tools); the app waits through the poller instead.
+    """
     for attempt in range(max_attempts):
         try:
             print(
                 f"⏳ Checking snapshot progress... (attempt {attempt + 1}/{max_attempts})"
             )
 
-            response = requests.get(progress_url, headers=headers)
-            response.raise_for_status()
-
-            progress_data = response.json()
-            status = progress_data.get("status")
+            status = await fetch_snapshot_status(snapshot_id)
 
             if status == "ready":
                 print("✅ Snapshot completed!")
@@ -34,32 +76,35 @@ def poll_snapshot_status(
                 return False
             elif status == "running":
                 print("🔄 Still processing...")
-                time.sleep(delay)
             else:
                 print(f"❓ Unknown status: {status}")
-                time.sleep(delay)
 
         except Exception as e:
             print(f"⚠️ Error checking progress: {e}")
-            time.sleep(delay)
+
+        await asyncio.sleep(clients.jittered(delay))
 
     print("⏰ Timeout waiting for snapshot completion")
     return False
 
 
-def download_snapshot(
+async def download_snapshot(
     snapshot_id: str, format: str = "json"
 ) -> Optional[List[Dict[Any, Any]]]:
-    api_key = os.getenv("BRIGHTDATA_TOKEN")
-    download_url = (
-        f"https://api.brightdata.com/datasets/v3/snapshot/{snapshot_id}?format={format}"
-    )
-    headers = {"Authorization": f"Bearer {api_key}"}
+    client = _get_client()
+    download_url = DOWNLOAD_URL.format(snapshot_id=snapshot_id)
+    headers = _auth_headers()
 
     try:
         print("📥 Downloading snapshot data...")
 
-        response = requests.get(download_url, headers=headers)
+        async with datasets_limiter:
+            response = await client.get(
+                download_url,
+                headers=headers,
+                params={"format": format},
+                timeout=DOWNLOAD_TIMEOUT,
+            )
         response.raise_for_status()
 
         data = response.json()
@@ -72,3 +117,95 @@ def download_snapshot(
     except Exception as e:
         print(f"❌ Error downloading snapshot: {e}")
         return None
+
+
+async def stream_snapshot(
+    snapshot_id: str,
+    fields: Dict[str, str],
+    max_records: int | None = SNAPSHOT_MAX_RECORDS,
+    max_bytes: int | None = SNAPSHOT_MAX_BYTES,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Download a snapshot as JSON Lines and yield one projected record per line.
+
+    ``fields`` maps output keys to snapshot keys, e.g. ``{"content": "comment"}``,
+    so only those values are kept. Reading stops after ``max_records`` records
+    or ``max_bytes`` bytes, whichever comes first. Only one line is buffered at
+    a time, so memory stays flat regardless of snapshot size.
+    """
+    client = _get_client()
+    download_url = DOWNLOAD_URL.format(snapshot_id=snapshot_id)
+
+    received = 0
+    emitted = 0
+    buffer = b""
+
+    async with datasets_limiter, client.stream(
+        "GET",
+        download_url,
+        headers=_auth_headers(),
+        params={"format": "jsonl"},
+        timeout=DOWNLOAD_TIMEOUT,
+    ) as response:
+        response.raise_for_status()
+
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+
+            for line in lines:
+                record = _project_line(line, fields)
+                if record is None:
+                    continue
+                yield record
+                emitted += 1
+                if max_records is not None and emitted >= max_records:
+                    print(f"✂️ Stopped at record cap ({max_records})")
+                    return
+
+            if max_bytes is not None and received >= max_bytes:
+                print(f"✂️ Stopped at byte cap ({max_bytes} bytes)")
+                return
+
+    # Last line may not be newline-terminated
+    record = _project_line(buffer, fields)
+    if record is not None:
+        yield record
+
+
+async def download_snapshot_records(
+    snapshot_id: str,
+    fields: Dict[str, str],
+    max_records: int | None = SNAPSHOT_MAX_RECORDS,
+    max_bytes: int | None = SNAPSHOT_MAX_BYTES,
+) -> Optional[List[Dict[str, Any]]]:
+    """Streaming counterpart of ``download_snapshot`` returning projected records."""
+    records: List[Dict[str, Any]] = []
+    try:
+        print("📥 Streaming snapshot data...")
+        async for record in stream_snapshot(snapshot_id, fields, max_records, max_bytes):
+            records.append(record)
+    except Exception as e:
+        print(f"❌ Error downloading snapshot: {e}")
+        if not records:
+            return None
+
+    print(f"🎉 Successfully downloaded {len(records)} items")
+    return records
+
+
+def _project_line(line: bytes, fields: Dict[str, str]) -> Dict[str, Any] | None:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+
+    # include_errors=true mixes per-input error rows into the output
+    if not isinstance(record, dict) or "error" in record:
+        return None
+
+    return {key: record.get(source) for key, source in fields.items()}
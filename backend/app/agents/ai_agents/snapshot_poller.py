@@ -0,0 +1,250 @@
+import os
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Dict
+from .snapshot_operations import fetch_snapshot_status, poll_snapshot_status
+
+
+# -----------------------------------------------
+#  Logging helper
+# -----------------------------------------------
+def log(message: str) -> None:
+    print(f"[SNAPSHOT POLLER] {message}")
+
+
+@dataclass
+class _PendingSnapshot:
+    future: asyncio.Future
+    registered_at: float
+    next_poll_at: float
+    attempts: int = 0
+    waiters: int = 0
+    expect_webhook: bool = False
+
+
+class SnapshotPoller:
+    """
+    One background task that polls every outstanding Bright Data snapshot.
+
+    Callers register a snapshot ID and await a future instead of running their
+    own polling loop. Each snapshot is polled on an adaptive schedule: the
+    first checks are ``fast_interval`` apart and the interval grows by
+    ``growth`` per attempt up to ``max_interval``. At most ``tick_budget``
+    progress requests are issued per tick; the most overdue snapshots go
+    first so nothing starves when the budget is exceeded.
+
+    Snapshots triggered with a ``notify`` webhook are resolved by ``notify()``
+    as soon as Bright Data calls back; for those, polling only runs every
+    ``webhook_fallback_interval`` as a safety net for lost notifications.
+    """
+
+    def __init__(
+        self,
+        fast_interval: float = 1.0,
+        max_interval: float = 15.0,
+        growth: float = 1.5,
+        tick: float = 0.5,
+        tick_budget: int = 10,
+        max_wait: float = 300,
+        webhook_fallback_interval: float = 30.0,
+        max_early: int = 1000,
+    ):
+        self.fast_interval = fast_interval
+        self.max_interval = max_interval
+        self.growth = growth
+        self.tick = tick
+        self.tick_budget = tick_budget
+        self.max_wait = max_wait
+        self.webhook_fallback_interval = webhook_fallback_interval
+        self.max_early = max_early
+
+        self._pending: Dict[str, _PendingSnapshot] = {}
+        # Notifications that arrived before anyone registered the snapshot
+        # (the webhook can beat the trigger response): id -> (ready, received_at),
+        # oldest first and capped at ``max_early`` entries
+        self._early: Dict[str, tuple[bool, float]] = {}
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._polls_issued = 0
+        self._notifications = 0
+
+    def start(self) -> None:
+        if self.is_running():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="snapshot-poller")
+        log("Started")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        for pending in self._pending.values():
+            if not pending.future.done():
+                pending.future.cancel()
+        self._pending.clear()
+        self._early.clear()
+        log("Stopped")
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def wait(self, snapshot_id: str, expect_webhook: bool = False) -> bool:
+        """
+        Wait until the snapshot is ready (True) or failed / timed out (False).
+
+        Falls back to a private polling loop when the shared poller is not
+        running. Several callers may wait on the same snapshot; cancelling one
+        waiter does not affect the others, and a snapshot nobody waits for
+        any more is dropped from the schedule.
+        """
+        if not self.is_running():
+            return await poll_snapshot_status(snapshot_id)
+
+        pending = self._register(snapshot_id, expect_webhook)
+        pending.waiters += 1
+        try:
+            return await asyncio.shield(pending.future)
+        finally:
+            pending.waiters -= 1
+            if pending.waiters == 0 and self._pending.get(snapshot_id) is pending:
+                del self._pending[snapshot_id]
+
+    def notify(self, snapshot_id: str, status: str) -> None:
+        """Resolve a snapshot from a Bright Data completion notification."""
+        if status not in ("ready", "failed"):
+            log(f"Ignoring notification for {snapshot_id}: status={status}")
+            return
+
+        self._notifications += 1
+        ready = status == "ready"
+        log(f"Notification: snapshot {snapshot_id} {status}")
+
+        if snapshot_id in self._pending:
+            self._resolve(snapshot_id, ready)
+            return
+
+        now = time.monotonic()
+        self._prune_early(now)
+        self._early.pop(snapshot_id, None)
+        while len(self._early) >= self.max_early:
+            del self._early[next(iter(self._early))]
+        self._early[snapshot_id] = (ready, now)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.is_running(),
+            "pending": len(self._pending),
+            "polls_issued": self._polls_issued,
+            "notifications": self._notifications,
+        }
+
+    def _register(self, snapshot_id: str, expect_webhook: bool) -> _PendingSnapshot:
+        pending = self._pending.get(snapshot_id)
+        if pending is None:
+            now = time.monotonic()
+            first_interval = (
+                self.webhook_fallback_interval if expect_webhook else self.fast_interval
+            )
+            pending = _PendingSnapshot(
+                future=asyncio.get_running_loop().create_future(),
+                registered_at=now,
+                next_poll_at=now + first_interval,
+                expect_webhook=expect_webhook,
+            )
+            self._pending[snapshot_id] = pending
+
+            early = self._early.pop(snapshot_id, None)
+            if early is not None:
+                self._resolve(snapshot_id, early[0])
+            elif self._wakeup is not None:
+                self._wakeup.set()
+        return pending
+
+    def _resolve(self, snapshot_id: str, ready: bool) -> None:
+        pending = self._pending.pop(snapshot_id, None)
+        if pending is not None and not pending.future.done():
+            pending.future.set_result(ready)
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            await self._poll_due()
+            await asyncio.sleep(self.tick)
+
+    async def _poll_due(self) -> None:
+        now = time.monotonic()
+
+        for snapshot_id, pending in list(self._pending.items()):
+            if now - pending.registered_at > self.max_wait:
+                log(f"Timeout waiting for snapshot {snapshot_id}")
+                self._resolve(snapshot_id, False)
+
+        self._prune_early(now)
+
+        due = sorted(
+            (p.next_poll_at, snapshot_id)
+            for snapshot_id, p in self._pending.items()
+            if p.next_poll_at <= now
+        )[: self.tick_budget]
+
+        if due:
+            await asyncio.gather(*(self._poll_one(snapshot_id) for _, snapshot_id in due))
+
+    def _prune_early(self, now: float) -> None:
+        # Entries are in arrival order, so expired ones are at the front
+        for snapshot_id, (_, received_at) in list(self._early.items()):
+            if now - received_at <= self.max_wait:
+                break
+            del self._early[snapshot_id]
+
+    async def _poll_one(self, snapshot_id: str) -> None:
+        self._polls_issued += 1
+        try:
+            status = await fetch_snapshot_status(snapshot_id)
+        except Exception as e:
+            log(f"Error checking {snapshot_id}: {e}")
+            status = None
+
+        if status == "ready":
+            log(f"Snapshot {snapshot_id} ready")
+            self._resolve(snapshot_id, True)
+            return
+        if status == "failed":
+            log(f"Snapshot {snapshot_id} failed")
+            self._resolve(snapshot_id, False)
+            return
+
+        pending = self._pending.get(snapshot_id)
+        if pending is not None:
+            pending.attempts += 1
+            if pending.expect_webhook:
+                interval = self.webhook_fallback_interval
+            else:
+                interval = min(
+                    self.max_interval, self.fast_interval * self.growth ** pending.attempts
+                )
+            pending.next_poll_at = time.monotonic() + interval
+
+
+snapshot_poller = SnapshotPoller(
+    fast_interval=float(os.getenv("SNAPSHOT_POLL_FAST_INTERVAL", "1.0")),
+    max_interval=float(os.getenv("SNAPSHOT_POLL_MAX_INTERVAL", "15.0")),
+    growth=float(os.getenv("SNAPSHOT_POLL_GROWTH", "1.5")),
+    tick=float(os.getenv("SNAPSHOT_POLL_TICK", "0.5")),
+    tick_budget=int(os.getenv("SNAPSHOT_POLL_TICK_BUDGET", "10")),
+    max_wait=float(os.getenv("SNAPSHOT_POLL_MAX_WAIT", "300")),
+    webhook_fallback_interval=float(os.getenv("SNAPSHOT_WEBHOOK_FALLBACK_INTERVAL", "30")),
+    max_early=int(os.getenv("SNAPSHOT_WEBHOOK_MAX_EARLY", "1000")),
+)
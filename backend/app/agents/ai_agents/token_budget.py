@@ -0,0 +1,269 @@
+import os
+import re
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Any, Dict, List
+
+
+# -----------------------------------------------
+#  Logging helper
+# -----------------------------------------------
+def log(message: str) -> None:
+    print(f"[TOKENS] {message}")
+
+
+# Per-source prompt budgets, in tokens
+SERP_TOKEN_BUDGET = int(os.getenv("PROMPT_BUDGET_SERP", "1500"))
+REDDIT_POSTS_TOKEN_BUDGET = int(os.getenv("PROMPT_BUDGET_REDDIT_POSTS", "800"))
+REDDIT_COMMENTS_TOKEN_BUDGET = int(os.getenv("PROMPT_BUDGET_REDDIT_COMMENTS", "4000"))
+ANALYSIS_TOKEN_BUDGET = int(os.getenv("PROMPT_BUDGET_ANALYSIS", "1500"))
+
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "o200k_base")  # gpt-4o
+
+# A comment cut shorter than this carries no usable opinion and is dropped
+MIN_COMMENT_TOKENS = 16
+
+_encoding = None
+_CJK = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+def warm_tokenizer() -> None:
+    """
+    Load the tiktoken encoding. It may download its BPE file on first use,
+    so the app calls this once off the event loop; until it succeeds token
+    counts are estimated from the text length.
+    """
+    global _encoding
+    if _encoding is not None:
+        return
+    try:
+        import tiktoken
+
+        _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        log(f"Using tiktoken {TOKENIZER_ENCODING}")
+    except Exception as e:
+        log(f"tiktoken unavailable ({e.__class__.__name__}), estimating token counts")
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    # About four characters per token for Latin text, one per CJK character
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def count_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    # A few tokens of framing per message, as the chat format adds them
+    return sum(count_tokens(str(message.get("content", ""))) + 4 for message in messages)
+
+
+def truncate(text: str, budget: int) -> str:
+    """``text`` cut to at most ``budget`` tokens, marked with an ellipsis."""
+    if budget <= 0:
+        return ""
+    if count_tokens(text) <= budget:
+        return text
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text, disallowed_special=())[: budget - 1]) + "…"
+
+    # Shrink by the estimated overshoot until it fits
+    while text and count_tokens(text) > budget - 1:
+        text = text[: max(0, int(len(text) * (budget - 1) / count_tokens(text)) - 1)]
+    return text + "…"
+
+
+def _fit_ranked(entries: List[str], budget: int | None, min_share: int = 8) -> List[str]:
+    """
+    Fit ranked entries into ``budget`` tokens. Entry ``i`` may use up to
+    ``scale / (i + 1)`` tokens, with ``scale`` as large as the budget allows,
+    so short entries leave room for the rest and long ones are truncated
+    harder the lower they rank. Entries whose share falls under
+    ``min_share`` are dropped, which cuts the tail first.
+    """
+    needs = [count_tokens(entry) + 1 for entry in entries]
+    if budget is None or sum(needs) <= budget:
+        return entries
+
+    weights = [1 / (rank + 1) for rank in range(len(entries))]
+
+    def shares(scale: float) -> List[int]:
+        return [
+            min(need, int(scale * weight)) if scale * weight >= min_share else 0
+            for need, weight in zip(needs, weights)
+        ]
+
+    low, high = 0.0, max(need / weight for need, weight in zip(needs, weights))
+    for _ in range(40):
+        middle = (low + high) / 2
+        if sum(shares(middle)) <= budget:
+            low = middle
+        else:
+            high = middle
+
+    return [truncate(entry, share - 1) for entry, share in zip(entries, shares(low)) if share]
+
+
+def _clean(value: Any) -> str:
+    return re.sub(r"\s+", " ", str(value)).strip() if value else ""
+
+
+def compact_serp(results: Any, budget: int | None = SERP_TOKEN_BUDGET) -> str:
+    """
+    One search engine's results as numbered ``title / url / snippet`` lines,
+    best ranked first and fitted to ``budget`` tokens. Everything else the
+    SERP API returns (raw HTML, tracking data, sitelinks) is left out.
+    """
+    if not results:
+        return ""
+    if not isinstance(results, dict):
+        return truncate(_clean(results), budget) if budget is not None else _clean(results)
+
+    entries = []
+    knowledge = results.get("knowledge") or {}
+    if isinstance(knowledge, dict):
+        summary = " - ".join(
+            _clean(knowledge.get(key)) for key in ("title", "subtitle", "description") if knowledge.get(key)
+        )
+        if summary:
+            entries.append(f"Knowledge panel: {summary}")
+
+    for rank, item in enumerate(results.get("organic") or [], start=1):
+        if not isinstance(item, dict):
+            continue
+        lines = [f"{rank}. {_clean(item.get('title'))}", _clean(item.get("link") or item.get("url"))]
+        snippet = _clean(item.get("snippet") or item.get("description"))
+        if snippet:
+            lines.append(snippet)
+        entries.append("\n".join(line for line in lines if line))
+
+    return "\n\n".join(_fit_ranked(entries, budget))
+
+
+def compact_reddit_posts(results: Any, budget: int | None = REDDIT_POSTS_TOKEN_BUDGET) -> str:
+    """Reddit search hits as ``title - url`` lines, fitted to ``budget`` tokens."""
+    if not results:
+        return ""
+    posts = results.get("parsed_posts") if isinstance(results, dict) else results
+    if not isinstance(posts, list):
+        return truncate(_clean(posts), budget) if budget is not None else _clean(posts)
+
+    entries = [
+        f"- {_clean(post.get('title'))} - {_clean(post.get('url'))}"
+        for post in posts
+        if isinstance(post, dict)
+    ]
+    return "\n".join(_fit_ranked(entries, budget))
+
+
+def compact_reddit_comments(post_data: Any, budget: int | None = REDDIT_COMMENTS_TOKEN_BUDGET) -> str:
+    """
+    Retrieved comments as ``[date] text`` lines, grouped by post and fitted
+    to ``budget`` tokens. The budget is split evenly across posts (a post
+    that needs less leaves the rest to the others) and each post keeps an
+    evenly spaced sample of its comments, so no post is crowded out by the
+    ones before it in the snapshot.
+    """
+    if not post_data:
+        return ""
+    comments = post_data.get("comments") if isinstance(post_data, dict) else post_data
+    if not isinstance(comments, list):
+        return truncate(_clean(comments), budget) if budget is not None else _clean(comments)
+
+    by_post: Dict[str | None, List[str]] = {}
+    for comment in comments:
+        if isinstance(comment, dict) and comment.get("content"):
+            by_post.setdefault(comment.get("post_url"), []).append(_comment_line(comment))
+
+    lines = [line for post_lines in by_post.values() for line in post_lines]
+    if budget is None or sum(count_tokens(line) + 1 for line in lines) <= budget:
+        return "\n".join(lines)
+
+    # Water-fill the budget: smallest posts first, each gets an equal share
+    # of what is left, capped at what it needs. With more posts than the
+    # budget can give a useful share, the first posts of the snapshot win.
+    posts = list(by_post)[: max(1, budget // MIN_COMMENT_TOKENS)]
+    needs = {post: sum(count_tokens(line) + 1 for line in by_post[post]) for post in posts}
+    shares: Dict[str | None, int] = {}
+    left = budget
+    for count, post in enumerate(sorted(needs, key=needs.__getitem__)):
+        shares[post] = min(needs[post], left // (len(needs) - count))
+        left -= shares[post]
+
+    kept = []
+    for post in posts:
+        kept.extend(_sample_comments(by_post[post], shares[post]))
+    return "\n".join(kept)
+
+
+def _sample_comments(lines: List[str], budget: int) -> List[str]:
+    """
+    The most comments that fit ``budget`` tokens, evenly spaced over
+    ``lines`` and kept in order. Long comments are cut to a quarter of the
+    budget so one of them cannot fill it; none is cut below
+    ``MIN_COMMENT_TOKENS``.
+    """
+    if budget < MIN_COMMENT_TOKENS:
+        return []
+    cap = max(MIN_COMMENT_TOKENS, budget // 4)
+    lines = [truncate(line, cap) for line in lines]
+    sizes = [count_tokens(line) + 1 for line in lines]
+    n = len(lines)
+    if sum(sizes) <= budget:
+        return lines
+
+    def picks(k: int) -> List[int]:
+        return [i * n // k for i in range(k)]
+
+    # No k comments fit if the k smallest don't, which bounds the search;
+    # then binary search the largest evenly spaced k that fits. The spaced
+    # sums are only roughly monotone in k, so this may settle a little
+    # below the exact maximum.
+    lo, hi = 0, bisect_right(list(accumulate(sorted(sizes))), budget)
+    while lo < hi:
+        k = (lo + hi + 1) // 2
+        if sum(sizes[i] for i in picks(k)) <= budget:
+            lo = k
+        else:
+            hi = k - 1
+    return [lines[i] for i in picks(lo)] if lo else []
+
+
+def chunk_reddit_comments(post_data: Any, chunk_tokens: int) -> List[tuple[str | None, str]]:
+    """
+    Comments grouped by ``post_url`` and packed into ``(post url, text)``
+    chunks of at most ``chunk_tokens`` tokens, in snapshot order. Comments
+    without a post URL are grouped together.
+    """
+    comments = post_data.get("comments") if isinstance(post_data, dict) else post_data
+    if not isinstance(comments, list):
+        return []
+
+    by_post: Dict[str | None, List[str]] = {}
+    for comment in comments:
+        if isinstance(comment, dict) and comment.get("content"):
+            by_post.setdefault(comment.get("post_url"), []).append(_comment_line(comment))
+
+    chunks = []
+    for post_url, lines in by_post.items():
+        current: List[str] = []
+        used = 0
+        for line in lines:
+            line = truncate(line, chunk_tokens)
+            size = count_tokens(line) + 1
+            if current and used + size > chunk_tokens:
+                chunks.append((post_url, "\n".join(current)))
+                current, used = [], 0
+            current.append(line)
+            used += size
+        if current:
+            chunks.append((post_url, "\n".join(current)))
+    return chunks
+
+
+def _comment_line(comment: Dict[str, Any]) -> str:
+    date = _clean(comment.get("date"))[:10]
+    content = _clean(comment["content"])
+    return f"- [{date}] {content}" if date else f"- {content}"
@@ -0,0 +1,216 @@
+import json
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List
+from .snapshot_operations import SNAPSHOT_MAX_RECORDS
+
+
+# -----------------------------------------------
+#  Logging helper
+# -----------------------------------------------
+def log(message: str) -> None:
+    print(f"[TRIGGER BATCHER] {message}")
+
+
+# Bright Data echoes each input on the records it produced: ``input`` for
+# collections by URL, ``discovery_input`` for discovery (keyword) runs.
+# These hidden projections carry it through the streamed download.
+_ECHO_FIELDS = {"__input": "input", "__discovery_input": "discovery_input"}
+
+
+@dataclass
+class _Entry:
+    inputs: List[Dict[str, Any]]
+    future: asyncio.Future
+    max_records: int | None
+
+
+@dataclass
+class _Batch:
+    trigger_url: str
+    params: Dict[str, Any]
+    fields: Dict[str, str]
+    input_key: str
+    operation_name: str
+    timeout: float
+    max_bytes: int | None
+    entries: List[_Entry] = field(default_factory=list)
+    timer: asyncio.TimerHandle | None = None
+
+    def input_count(self) -> int:
+        return sum(len(entry.inputs) for entry in self.entries)
+
+
+class TriggerBatcher:
+    """
+    Collects dataset inputs from concurrent callers into one snapshot.
+
+    Calls that share a trigger URL, params and projected fields join the
+    same batch; it is submitted ``window`` seconds after its first input
+    arrived, or as soon as it holds ``max_inputs`` inputs. The job itself
+    is run by ``run`` (trigger, wait, streamed download) and every caller
+    gets back only the records produced by its own inputs, matched on
+    ``input_key`` (e.g. ``keyword`` or ``url``).
+
+    A caller that is cancelled stops waiting; the batch keeps running for
+    the others.
+    """
+
+    def __init__(
+        self,
+        run: Callable[..., Awaitable[Any]],
+        window: float = 0.2,
+        max_inputs: int = 20,
+    ):
+        self.run = run
+        self.window = window
+        self.max_inputs = max_inputs
+
+        self._open: Dict[str, _Batch] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._batches = 0
+        self._callers = 0
+        self._inputs = 0
+        self._largest_batch = 0
+        self._unmatched = 0
+
+    async def submit(
+        self,
+        trigger_url: str,
+        params: Dict[str, Any],
+        data: List[Dict[str, Any]],
+        fields: Dict[str, str],
+        input_key: str,
+        operation_name: str,
+        timeout: float,
+        max_records: int | None = SNAPSHOT_MAX_RECORDS,
+        max_bytes: int | None = None,
+    ) -> List[Dict[str, Any]] | None:
+        group = json.dumps([trigger_url, params, fields, input_key], sort_keys=True, default=str)
+        batch = self._open.get(group)
+        if batch is None:
+            batch = _Batch(
+                trigger_url, params, fields, input_key, operation_name, timeout, max_bytes
+            )
+            self._open[group] = batch
+            batch.timer = asyncio.get_running_loop().call_later(
+                self.window, self._flush, group, batch
+            )
+
+        entry = _Entry(data, asyncio.get_running_loop().create_future(), max_records)
+        batch.entries.append(entry)
+        if batch.input_count() >= self.max_inputs:
+            self._flush(group, batch)
+
+        return await entry.future
+
+    def stats(self) -> dict:
+        return {
+            "batches": self._batches,
+            "callers": self._callers,
+            "inputs": self._inputs,
+            "largest_batch": self._largest_batch,
+            "unmatched_records": self._unmatched,
+            "open": len(self._open),
+        }
+
+    def _flush(self, group: str, batch: _Batch) -> None:
+        if self._open.get(group) is not batch:
+            return
+        del self._open[group]
+        if batch.timer is not None:
+            batch.timer.cancel()
+
+        task = asyncio.create_task(self._run_batch(batch), name="trigger-batch")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: _Batch) -> None:
+        # Identical inputs from different callers are collected once
+        unique: Dict[str, Dict[str, Any]] = {}
+        for entry in batch.entries:
+            for item in entry.inputs:
+                unique.setdefault(json.dumps(item, sort_keys=True, default=str), item)
+        inputs = list(unique.values())
+
+        # The download is capped at the callers' caps combined; each caller's
+        # own cap is applied to its slice after demultiplexing
+        caps = [entry.max_records for entry in batch.entries]
+        stream_limits: Dict[str, Any] = {
+            "max_records": None if None in caps else sum(caps)  # type: ignore[arg-type]
+        }
+        if batch.max_bytes is not None:
+            stream_limits["max_bytes"] = batch.max_bytes
+
+        self._batches += 1
+        self._callers += len(batch.entries)
+        self._inputs += len(inputs)
+        self._largest_batch = max(self._largest_batch, len(inputs))
+        if len(batch.entries) > 1:
+            log(f"{batch.operation_name}: {len(inputs)} inputs from {len(batch.entries)} callers in one snapshot")
+
+        try:
+            try:
+                records = await self.run(
+                    batch.trigger_url,
+                    batch.params,
+                    inputs,
+                    batch.operation_name,
+                    batch.timeout,
+                    {**batch.fields, **_ECHO_FIELDS},
+                    stream_limits,
+                )
+            except Exception as e:
+                for entry in batch.entries:
+                    if not entry.future.done():
+                        entry.future.set_exception(e)
+                return
+
+            for entry, result in zip(batch.entries, self._demultiplex(batch, records)):
+                if not entry.future.done():
+                    entry.future.set_result(result)
+        finally:
+            # Cancelled (e.g. at shutdown) or failed while demultiplexing:
+            # nobody may be left waiting on the batch
+            for entry in batch.entries:
+                if not entry.future.done():
+                    entry.future.set_exception(
+                        RuntimeError(f"{batch.operation_name}: snapshot batch did not complete")
+                    )
+
+    def _demultiplex(self, batch: _Batch, records) -> List[List[Dict[str, Any]] | None]:
+        if records is None:
+            return [None] * len(batch.entries)
+
+        # A lone caller owns every record, echoed input or not
+        if len(batch.entries) == 1:
+            cap = batch.entries[0].max_records
+            return [[_strip(record) for record in records][:cap]]
+
+        by_value: Dict[Any, List[Dict[str, Any]]] = {}
+        for record in records:
+            value = _echoed_value(record, batch.input_key)
+            if value is None:
+                self._unmatched += 1
+                continue
+            by_value.setdefault(value, []).append(_strip(record))
+
+        results = []
+        for entry in batch.entries:
+            matched = []
+            for value in dict.fromkeys(item.get(batch.input_key) for item in entry.inputs):
+                matched.extend(by_value.get(value, []))
+            results.append(matched[: entry.max_records])
+        return results
+
+
+def _echoed_value(record: Dict[str, Any], input_key: str) -> Any:
+    for hidden in _ECHO_FIELDS:
+        echoed = record.get(hidden)
+        if isinstance(echoed, dict) and echoed.get(input_key) is not None:
+            return echoed[input_key]
+    return None
+
+
+def _strip(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in record.items() if key not in _ECHO_FIELDS}
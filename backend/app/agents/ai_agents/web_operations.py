@@ -2,21 +2,81 @@ from dotenv import load_dotenv
 import os
 import json
 from fastapi import FastAPI
-import requests
 from urllib.parse import quote_plus
-from .snapshot_operations import download_snapshot, poll_snapshot_status
-from bs4 import BeautifulSoup
+from .snapshot_operations import download_snapshot, download_snapshot_records
+from .snapshot_poller import snapshot_poller
+from .trigger_batcher import TriggerBatcher
+from .html_parsing import parse_baidu_html, parse_response_text, run_parser
 from typing import Any, Dict
 import httpx
 import contextlib
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+import asyncio
 import time
+import hashlib
 import clients
+from cache import TTLCache, normalize_query
+from singleflight import SingleFlight
+from limits import get_limiter
+from circuit_breaker import CircuitBreaker
+from hedging import Hedger
 
 load_dotenv(override=True)
 
 dataset_id = "gd_lvz8ah06191smkebj4"
 
+# Upper bound for trigger + poll + download of one snapshot, in seconds.
+SNAPSHOT_TIMEOUT = float(os.getenv("SNAPSHOT_TIMEOUT", "300"))
+
+# Public URL of main.py's /api/snapshots/notify route. When set, Bright Data
+# calls it as soon as a snapshot is ready and polling becomes a slow fallback.
+# The route refuses unauthenticated calls, so the webhook needs the secret too.
+SNAPSHOT_WEBHOOK_URL = os.getenv("SNAPSHOT_WEBHOOK_URL")
+SNAPSHOT_WEBHOOK_SECRET = os.getenv("SNAPSHOT_WEBHOOK_SECRET")
+if SNAPSHOT_WEBHOOK_URL and not SNAPSHOT_WEBHOOK_SECRET:
+    print("⚠️ SNAPSHOT_WEBHOOK_URL is set without SNAPSHOT_WEBHOOK_SECRET; snapshot webhook disabled")
+    SNAPSHOT_WEBHOOK_URL = None
+
+# SERP response cache: per-engine TTLs in seconds (0 disables caching for that
+# engine), LRU size, and an optional SQLite file shared across workers.
+SERP_CACHE_TTLS = {
+    "google": float(os.getenv("SERP_CACHE_TTL_GOOGLE", "3600")),
+    "bing": float(os.getenv("SERP_CACHE_TTL_BING", "3600")),
+    "baidu": float(os.getenv("SERP_CACHE_TTL_BAIDU", "3600")),
+}
+serp_cache = TTLCache(
+    "serp",
+    max_entries=int(os.getenv("SERP_CACHE_MAX_ENTRIES", "1024")),
+    db_path=os.getenv("SERP_CACHE_DB"),
+)
+
+# Overlapping queries share one upstream call instead of each paying for it
+serp_flight = SingleFlight("serp")
+
+# Hedged SERP requests: a second identical request is sent when the first is
+# slower than the engine's recent p90. SERP_HEDGE_MAX_RATE caps hedges as a
+# share of requests; 0 (the default) turns hedging off. Dataset triggers are
+# never hedged, since each one starts a billed collection.
+SERP_HEDGE_MAX_RATE = float(os.getenv("SERP_HEDGE_MAX_RATE", "0"))
+serp_hedgers = {
+    engine: Hedger(engine, max_rate=SERP_HEDGE_MAX_RATE) for engine in SERP_CACHE_TTLS
+}
+
+# One breaker per engine: while an engine keeps failing (or answering slower
+# than SERP_BREAKER_SLOW_SECONDS) its searches return None immediately.
+serp_breakers = {
+    engine: CircuitBreaker(
+        engine,
+        window=int(os.getenv("SERP_BREAKER_WINDOW", "20")),
+        min_calls=int(os.getenv("SERP_BREAKER_MIN_CALLS", "5")),
+        failure_rate=float(os.getenv("SERP_BREAKER_FAILURE_RATE", "0.5")),
+        slow_seconds=float(os.getenv("SERP_BREAKER_SLOW_SECONDS", "15")),
+        open_seconds=float(os.getenv("SERP_BREAKER_OPEN_SECONDS", "30")),
+    )
+    for engine in SERP_CACHE_TTLS
+}
+snapshot_flight = SingleFlight("snapshot")
+
 import os
 import json
 from typing import Any, Dict
@@ -33,6 +93,10 @@ def log(message: str) -> None:
 #  Pydantic Response Model
 # -----------------------------------------------
 class ApiResponse(BaseModel):
+    # Keep fields outside the SERP shape (e.g. the dataset trigger's
+    # ``snapshot_id``) instead of silently dropping them.
+    model_config = ConfigDict(extra="allow")
+
     knowledge: Dict[str, Any] = Field(default_factory=dict)
     organic: list = Field(default_factory=list)
     
@@ -40,35 +104,26 @@ class ApiResponse(BaseModel):
 # -----------------------------------------------
 #  Unified JSON / HTML parsing
 # -----------------------------------------------
-def parse_response_text(text: str) -> Dict[str, Any]:
-    """
-    Tries JSON parsing first.
-    If JSON fails, falls back to HTML parsing.
-    Always returns a dict.
-    """
-    # Try JSON
-    with contextlib.suppress(json.JSONDecodeError):
-        return json.loads(text)    
-
-    # Try HTML
-    with contextlib.suppress(Exception):
-        soup = BeautifulSoup(text, "html.parser")
+def _retry_after(response: httpx.Response) -> float | None:
+    """Seconds from a numeric Retry-After header, if present."""
+    with contextlib.suppress(TypeError, ValueError):
+        return float(response.headers.get("Retry-After"))
+    return None
 
-        # Example logic: extract text blocks or divs
-        paragraphs = [p.get_text(strip=True) for p in soup.find_all("p")]
-        return {"html_raw": text, "html_parsed": paragraphs}
-
-    # Fallback: empty dict
-    return {}
-    
 
 async def _make_api_request(
     url: str,
     engine: str,
+    upstream: str = "brightdata-serp",
     **kwargs: Any, 
    
 ) -> Dict[str, Any]:
-    """Make an async HTTP POST request and always return a dict."""
+    """
+    Make an async HTTP POST request and always return a dict.
+
+    Each attempt waits its turn on the ``upstream`` limiter; a 429 pauses
+    that limiter for everyone instead of each caller retrying on its own.
+    """
 
     api_key = os.getenv("BRIGHTDATA_TOKEN")
 
@@ -83,25 +138,36 @@ async def _make_api_request(
    
     if clients.client is None:
         raise RuntimeError("HTTP client not initialized")
+
+    limiter = get_limiter(upstream)
+
+    async def send() -> httpx.Response:
+        async with limiter:
+            return await clients.client.post(url, headers=headers, **kwargs)  # type: ignore[union-attr]
+
+    hedger = serp_hedgers.get(engine) if SERP_HEDGE_MAX_RATE else None
     
     # Simple retry logic (3 attempts)
     for attempt in range(len(backoff_delays) + 1):
         try:
             log(f"Sending request to {engine} (Attempt {attempt + 1})")
-            response = await clients.client.post(url, headers=headers, **kwargs)
+            # A fast 429/5xx must not beat a healthy request still in flight
+            response = await (
+                hedger.run(send, success=lambda response: response.is_success) if hedger else send()
+            )
             response.raise_for_status()
 
             text = response.text
 
-            # Baidu may return HTML → attempt both
+            # Baidu returns the raw SERP page; _fetch_serp extracts the results
             if engine == "baidu":
-                data = parse_response_text(text)
+                return {"html_raw": text}
             else:
                 # Normal engines return JSON
                 try:
                     data = response.json()
                 except json.JSONDecodeError:
-                    data = parse_response_text(text)
+                    data = await run_parser(parse_response_text, text)
 
                 # Validate using Pydantic
                 try:
@@ -118,31 +184,23 @@ async def _make_api_request(
         except httpx.HTTPStatusError as e:
             log(f"HTTP {e.response.status_code}: {e}")
 
+            # Rate limited: the limiter holds back every caller until the
+            # upstream is ready, so no extra per-caller sleep
+            if e.response.status_code == 429 and attempt < len(backoff_delays):
+                limiter.pause(_retry_after(e.response) or backoff_delays[attempt])
+                continue
+
         # If failed and retries left → wait
         if attempt < len(backoff_delays):
-            delay = backoff_delays[attempt]
-            log(f"Retrying in {delay}s...")
-            time.sleep(delay)
+            delay = clients.jittered(backoff_delays[attempt])
+            log(f"Retrying in {delay:.2f}s...")
+            await asyncio.sleep(delay)
 
     log("All retries failed.")
 
     # If all retries failed → safe fallback
     return {}
 
-def parse_baidu_html(html):
-    soup = BeautifulSoup(html, "html.parser")
-    results = []
-    for item in soup.select(".result"):  # Baidu SERPs usually use .result class
-        title_tag = item.select_one("h3 a")
-        snippet_tag = item.select_one(".c-abstract")
-        if title_tag:
-            results.append({
-                "title": title_tag.get_text(strip=True),
-                "url": title_tag.get("href"),
-                "snippet": snippet_tag.get_text(strip=True) if snippet_tag else ""
-            })
-    return results
-
 async def serp_search(query, engine="google"):
     if engine == "google":
         base_url = "https://www.google.com/search"
@@ -156,43 +214,167 @@ async def serp_search(query, engine="google"):
     else:
         raise ValueError(f"Unknown engine {engine}")
 
-    url = "https://api.brightdata.com/request"
-    
+    cache_key = f"{engine}:{normalize_query(query)}"
+    cached = await serp_cache.get(cache_key)
+    if cached is not None:
+        log(f"SERP cache hit for {engine}")
+        return cached
+
     if engine in ["google", "bing"]:
         url_with_query = f"{base_url}?{query_param}={quote_plus(query)}&brd_json=1"    
     elif engine == "baidu":
         url_with_query = f"{base_url}?{query_param}={quote_plus(query)}"
 
+    return await serp_flight.do(
+        cache_key, lambda: _fetch_serp(url_with_query, engine, cache_key)
+    )
+
+
+async def _fetch_serp(url_with_query, engine, cache_key):
+    url = "https://api.brightdata.com/request"
+
+    breaker = serp_breakers[engine]
+    if not breaker.allow():
+        log(f"{engine} circuit open, skipping search")
+        return None
+
     payload = {"zone": "ai_agent", "url": url_with_query, "format": "raw"}
+    started = time.monotonic()
+    try:
+        search_results = await _request_serp(url, engine, payload)
+    except asyncio.CancelledError:
+        # Our caller gave up (latency budget, client disconnect): that says
+        # nothing about the upstream unless the call was already slow
+        elapsed = time.monotonic() - started
+        if elapsed >= breaker.slow_seconds:
+            breaker.record(False, elapsed)
+        else:
+            breaker.release()
+        raise
+    except Exception:
+        breaker.record(False, time.monotonic() - started)
+        raise
+
+    # An empty result list (e.g. a Baidu captcha page) is a failure, not an answer
+    ok = bool(search_results and search_results["organic"])
+    breaker.record(ok, time.monotonic() - started)
+    if not ok:
+        return None
+
+    await serp_cache.set(cache_key, search_results, SERP_CACHE_TTLS[engine])
+    return search_results
+
+
+async def _request_serp(url, engine, payload):
     full_response = await _make_api_request(url, engine, json=payload)
-    
     if not full_response:
         return None
 
     # Special case for Baidu → parse HTML
     if engine == "baidu":
-        results = parse_baidu_html(full_response)
+        results = await run_parser(parse_baidu_html, full_response.get("html_raw", ""))
         return {"organic": results, "knowledge": {}}
-    
     return {
         "knowledge": full_response.get("knowledge", {}), 
         "organic": full_response.get("organic", []), 
     }
 
 
-async def _trigger_and_download_snapshot(trigger_url, params, data, operation_name="operation"):
-    trigger_result = await _make_api_request(trigger_url, engine="", params=params, json=data)
-    if not trigger_result:
-        return None
+async def _trigger_and_download_snapshot(
+    trigger_url,
+    params,
+    data,
+    operation_name="operation",
+    timeout=SNAPSHOT_TIMEOUT,
+    fields=None,
+    input_key=None,
+    **stream_limits,
+):
+    """
+    Trigger a Bright Data collection, wait for the snapshot and download it.
 
-    snapshot_id = trigger_result.get("snapshot_id")  # type: ignore[arg-type]
-    if not snapshot_id:
-        return None
+    With ``fields`` (output key -> snapshot key) the snapshot is streamed as
+    JSON Lines and only those fields are kept; ``stream_limits`` forwards
+    ``max_records`` / ``max_bytes`` to the streaming download. Without it the
+    whole snapshot is downloaded as JSON.
+
+    The whole round-trip is bounded by ``timeout``. If the caller is cancelled
+    (e.g. its own ``asyncio.wait_for`` expires) the cancellation propagates
+    through the in-flight request or sleep instead of being swallowed.
+
+    Identical concurrent requests share one snapshot job. With ``input_key``
+    (streamed downloads only) inputs from concurrent calls are batched into
+    one snapshot by ``trigger_batcher`` and each call gets back the records
+    whose echoed input matches one of its own.
+    """
+    key = hashlib.sha256(
+        json.dumps(
+            [trigger_url, params, data, fields, stream_limits], sort_keys=True, default=str
+        ).encode("utf-8")
+    ).hexdigest()
+
+    if input_key and fields and trigger_batcher.window > 0:
+        return await snapshot_flight.do(
+            key,
+            lambda: trigger_batcher.submit(
+                trigger_url, params, data, fields, input_key, operation_name, timeout,
+                **stream_limits,
+            ),
+        )
+
+    return await snapshot_flight.do(
+        key,
+        lambda: _run_snapshot_job(
+            trigger_url, params, data, operation_name, timeout, fields, stream_limits
+        ),
+    )
 
-    if not poll_snapshot_status(snapshot_id):
+
+async def _run_snapshot_job(
+    trigger_url, params, data, operation_name, timeout, fields, stream_limits
+):
+    if SNAPSHOT_WEBHOOK_URL:
+        params = {**params, "notify": SNAPSHOT_WEBHOOK_URL, "auth_header": SNAPSHOT_WEBHOOK_SECRET}
+
+    try:
+        async with asyncio.timeout(timeout):
+            trigger_result = await _make_api_request(
+                trigger_url,
+                engine="",
+                upstream="brightdata-datasets",
+                params=params,
+                json=data,
+            )
+            if not trigger_result:
+                return None
+
+            snapshot_id = trigger_result.get("snapshot_id")  # type: ignore[arg-type]
+            if not snapshot_id:
+                return None
+
+            if not await snapshot_poller.wait(
+                snapshot_id, expect_webhook=bool(SNAPSHOT_WEBHOOK_URL)
+            ):
+                return None
+
+            if fields:
+                return await download_snapshot_records(
+                    snapshot_id, fields, **stream_limits
+                )
+            return await download_snapshot(snapshot_id)
+    except TimeoutError:
+        log(f"{operation_name}: snapshot not available after {timeout}s")
         return None
 
-    return download_snapshot(snapshot_id)
+
+# Reddit inputs from concurrent queries are collected for SNAPSHOT_BATCH_WINDOW
+# seconds (or until SNAPSHOT_BATCH_MAX_INPUTS) and triggered as one snapshot;
+# 0 disables batching.
+trigger_batcher = TriggerBatcher(
+    _run_snapshot_job,
+    window=float(os.getenv("SNAPSHOT_BATCH_WINDOW", "0.2")),
+    max_inputs=int(os.getenv("SNAPSHOT_BATCH_MAX_INPUTS", "20")),
+)
 
 
 async def reddit_search_api(keyword, date="All time", sort_by="Hot", num_of_posts=15):
@@ -217,27 +399,26 @@ async def reddit_search_api(keyword, date="All time", sort_by="Hot", num_of_post
         }
     ]
 
-    raw_data = await _trigger_and_download_snapshot(
-        trigger_url, params, data, operation_name="reddit"
+    parsed_data = await _trigger_and_download_snapshot(
+        trigger_url,
+        params,
+        data,
+        operation_name="reddit",
+        fields={"title": "title", "url": "url"},
+        input_key="keyword",
+        max_records=num_of_posts,
     )
 
-    if not raw_data:
+    if not parsed_data:
         return None
 
-    parsed_data = []
-    #if parsed_data:
-    for post in raw_data:
-        parsed_post = {
-            "title": post.get("title"),
-            "url": post.get("url")
-        }
-        parsed_data.append(parsed_post)
-
     return {"parsed_posts": parsed_data, "total_found": len(parsed_data)}
 
-import requests
+# Dataset ids do not change, so each name is looked up once per process
+_dataset_ids: dict[str, str] = {}
 
-def get_dataset_id(api_token: str, dataset_name: str) -> str | None:
+
+async def get_dataset_id(api_token: str, dataset_name: str) -> str | None:
     # sourcery skip: inline-variable, move-assign-in-block, use-named-expression
     """
     Get Bright Data dataset ID (gd_xxx) by dataset name.
@@ -246,35 +427,44 @@ def get_dataset_id(api_token: str, dataset_name: str) -> str | None:
     :param dataset_name: Name of the dataset you created
     :return: Dataset ID (gd_xxx...) if found, otherwise None
     """
-    
+    if dataset_name in _dataset_ids:
+        return _dataset_ids[dataset_name]
+
+    if clients.client is None:
+        raise RuntimeError("HTTP client not initialized")
+
     url = "https://api.brightdata.com/datasets"
     headers = {
         "Authorization": f"Bearer {api_token}"
     }
 
     try:
-        response = requests.get(url, headers=headers)
+        async with get_limiter("brightdata-datasets"):
+            response = await clients.client.get(url, headers=headers)
         response.raise_for_status()
         datasets = response.json().get("datasets", [])
-
-        return next(
-            (
-                ds.get("id")
-                for ds in datasets
-                if ds.get("name") == dataset_name
-            ),
-            None,
-        )
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching datasets: {e}")
+    except (httpx.HTTPError, ValueError) as e:
+        log(f"Error fetching datasets: {e}")
         return None
 
+    dataset_id = next(
+        (
+            ds.get("id")
+            for ds in datasets
+            if ds.get("name") == dataset_name
+        ),
+        None,
+    )
+    if dataset_id:
+        _dataset_ids[dataset_name] = dataset_id
+    return dataset_id
+
     """
     # Example usage
     API_TOKEN = "your_real_api_token_here"
     dataset_name = "My Lotto Dataset"  # whatever you named it in Bright Data
 
-    dataset_id = get_dataset_id(API_TOKEN, dataset_name)
+    dataset_id = await get_dataset_id(API_TOKEN, dataset_name)
     if dataset_id:
         print(f"Dataset ID for '{dataset_name}': {dataset_id}")
     else:
@@ -297,7 +487,7 @@ async def reddit_post_retrieval(urls, days_back=10, load_all_replies=False, comm
     if not API_KEY:
         return None
     
-    if dataset_id2 := get_dataset_id(API_KEY, dataset_name):
+    if dataset_id2 := await get_dataset_id(API_KEY, dataset_name):
         print(f"Dataset ID for '{dataset_name}': {dataset_id2}")
     else:
         print(f"Dataset '{dataset_name}' not found.")
@@ -316,20 +506,21 @@ async def reddit_post_retrieval(urls, days_back=10, load_all_replies=False, comm
         for url in urls
     ]
 
-    raw_data = await _trigger_and_download_snapshot(
-        trigger_url, params, data, operation_name="reddit comments"
+    parsed_comments = await _trigger_and_download_snapshot(
+        trigger_url,
+        params,
+        data,
+        operation_name="reddit comments",
+        fields={
+            "comment_id": "comment_id",
+            "content": "comment",
+            "date": "date_posted",
+            "post_url": "post_url",
+        },
+        input_key="url",
     )
-    if not raw_data:
+    if not parsed_comments:
         return None
 
-    parsed_comments = []
-    for comment in raw_data:
-        parsed_comment = {
-            "comment_id": comment.get("comment_id"),
-            "content": comment.get("comment"),
-            "date": comment.get("date_posted"),
-        }
-        parsed_comments.append(parsed_comment)
-
     return {"comments": parsed_comments, "total_retrieved": len(parsed_comments)}
 
@@ -0,0 +1,187 @@
+"""
+End-to-end latency of the research graph with stubbed upstreams.
+
+Compares the old topology (every analysis waits for retrieve_reddit_posts)
+with the pipelined one (each source runs search -> analysis on its own).
+No network or OpenAI calls are made: every search, snapshot and LLM call is
+replaced by an ``asyncio.sleep`` of the latency below.
+
+Run from backend/app:
+
+    python -m benchmarks.bench_graph_topology [--scale 0.01] [--runs 5]
+"""
+import os
+import time
+import asyncio
+import argparse
+import statistics
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from langgraph.graph import StateGraph, START, END
+from agents.ai_agents import ai_agent_search as search
+from agents.ai_agents.prompts import PromptTemplates
+
+
+# Simulated upstream latencies in seconds (multiplied by --scale)
+LATENCIES = {
+    "google": 1.5,
+    "bing": 1.2,
+    "baidu": 2.0,
+    "reddit_search": 6.0,
+    "reddit_url_selection": 1.0,
+    "reddit_retrieval": 8.0,
+    "google_analysis": 6.0,
+    "bing_analysis": 5.0,
+    "baidu_analysis": 5.0,
+    "reddit_analysis": 4.0,
+    "synthesis": 8.0,
+}
+
+SYSTEM_PROMPTS = {
+    PromptTemplates.google_analysis_system(): "google_analysis",
+    PromptTemplates.bing_analysis_system(): "bing_analysis",
+    PromptTemplates.baidu_analysis_system(): "baidu_analysis",
+    PromptTemplates.reddit_analysis_system(): "reddit_analysis",
+    PromptTemplates.synthesis_system(): "synthesis",
+}
+
+scale = 0.01
+
+
+async def _sleep(name: str) -> None:
+    await asyncio.sleep(LATENCIES[name] * scale)
+
+
+class _Reply:
+    def __init__(self, content):
+        self.content = content
+
+
+class StubStructuredLLM:
+    async def ainvoke(self, messages, **kwargs):
+        await _sleep("reddit_url_selection")
+        return search.RedditURLAnalysis(selected_urls=["https://reddit.com/r/x/1"])
+
+
+class StubLLM:
+    async def ainvoke(self, messages, **kwargs):
+        name = SYSTEM_PROMPTS[messages[0]["content"]]
+        await _sleep(name)
+        return _Reply(f"{name} text")
+
+    def with_structured_output(self, schema):
+        return StubStructuredLLM()
+
+
+async def stub_serp_search(query, engine="google"):
+    await _sleep(engine)
+    return {"knowledge": {}, "organic": [{"title": engine, "link": "https://example.com"}]}
+
+
+async def stub_reddit_search_api(keyword, **kwargs):
+    await _sleep("reddit_search")
+    return {"parsed_posts": [{"title": "post", "url": "https://reddit.com/r/x/1"}], "total_found": 1}
+
+
+async def stub_reddit_post_retrieval(urls, **kwargs):
+    await _sleep("reddit_retrieval")
+    return {"comments": [{"comment_id": "c1", "content": "comment", "date": "today"}], "total_retrieved": 1}
+
+
+def build_legacy_graph():
+    """The topology before pipelining: all analyses wait for Reddit retrieval."""
+    builder = StateGraph(search.State)
+
+    builder.add_node("google_search", search.google_search)
+    builder.add_node("bing_search", search.bing_search)
+    builder.add_node("baidu_search", search.baidu_search)
+    builder.add_node("reddit_search", search.reddit_search)
+    builder.add_node("analyze_reddit_posts", search.analyze_reddit_posts)
+    builder.add_node("retrieve_reddit_posts", search.retrieve_reddit_posts)
+    builder.add_node("analyze_google_results", search.analyze_google_results)
+    builder.add_node("analyze_bing_results", search.analyze_bing_results)
+    builder.add_node("analyze_baidu_results", search.analyze_baidu_results)
+    builder.add_node("analyze_reddit_results", search.analyze_reddit_results)
+    builder.add_node("synthesize_analyses", search.synthesize_analyses)
+
+    for node in ["google_search", "bing_search", "baidu_search", "reddit_search"]:
+        builder.add_edge(START, node)
+        builder.add_edge(node, "analyze_reddit_posts")
+    builder.add_edge("analyze_reddit_posts", "retrieve_reddit_posts")
+
+    for node in [
+        "analyze_google_results",
+        "analyze_bing_results",
+        "analyze_baidu_results",
+        "analyze_reddit_results",
+    ]:
+        builder.add_edge("retrieve_reddit_posts", node)
+        builder.add_edge(node, "synthesize_analyses")
+
+    builder.add_edge("synthesize_analyses", END)
+    return builder.compile()
+
+
+def initial_state(question: str) -> dict:
+    return {
+        "messages": [{"role": "user", "content": question}],
+        "user_question": question,
+        "google_results": None,
+        "bing_results": None,
+        "baidu_results": None,
+        "reddit_results": None,
+        "selected_reddit_urls": None,
+        "reddit_post_data": None,
+        "google_analysis": None,
+        "bing_analysis": None,
+        "baidu_analysis": None,
+        "reddit_analysis": None,
+        "final_answer": None,
+    }
+
+
+async def measure(graph, runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        final_state = await graph.ainvoke(initial_state("benchmark question"))
+        timings.append(time.perf_counter() - start)
+        assert final_state.get("final_answer")
+    return timings
+
+
+def install_stubs() -> None:
+    search.llm = StubLLM()
+    search.serp_search = stub_serp_search
+    search.reddit_search_api = stub_reddit_search_api
+    search.reddit_post_retrieval = stub_reddit_post_retrieval
+
+
+async def main() -> None:
+    global scale
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", type=float, default=0.01, help="multiplier for simulated latencies")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    scale = args.scale
+
+    install_stubs()
+
+    results = {
+        "legacy": await measure(build_legacy_graph(), args.runs),
+        "pipelined": await measure(search.graph, args.runs),
+    }
+
+    print(f"{'topology':<12}{'mean (s)':>12}{'min (s)':>12}{'simulated (s)':>16}")
+    for name, timings in results.items():
+        mean = statistics.mean(timings)
+        print(f"{name:<12}{mean:>12.3f}{min(timings):>12.3f}{mean / scale:>16.1f}")
+
+    saved = statistics.mean(results["legacy"]) - statistics.mean(results["pipelined"])
+    print(f"\nPipelining saves {saved / scale:.1f}s of simulated end-to-end latency per query")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""
+Baidu SERP extraction: legacy parser vs strained parser in the worker pool.
+
+Parses the saved pages in benchmarks/fixtures with the old path (full
+html.parser tree, on the event loop) and the new one (only ``.result``
+blocks, lxml when installed, via ``run_parser``). Reports CPU time per page
+and the longest event-loop stall while a batch of pages is parsed
+concurrently, which is what other requests feel.
+
+Run from backend/app:
+
+    python -m benchmarks.bench_html_parsing [--runs 20] [--concurrency 8]
+"""
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+from bs4 import BeautifulSoup
+
+from agents.ai_agents import html_parsing
+from agents.ai_agents.html_parsing import parse_baidu_html, run_parser
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def legacy_parse_baidu_html(html):
+    soup = BeautifulSoup(html, "html.parser")
+    results = []
+    for item in soup.select(".result"):  # Baidu SERPs usually use .result class
+        title_tag = item.select_one("h3 a")
+        snippet_tag = item.select_one(".c-abstract")
+        if title_tag:
+            results.append({
+                "title": title_tag.get_text(strip=True),
+                "url": title_tag.get("href"),
+                "snippet": snippet_tag.get_text(strip=True) if snippet_tag else ""
+            })
+    return results
+
+
+def cpu_time(fn, html: str, runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(html)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def max_stall(parse, pages: list[str]) -> tuple[float, float]:
+    """Longest gap between 1ms heartbeats while ``pages`` are parsed, and wall time."""
+    stall = 0.0
+    done = False
+
+    async def heartbeat():
+        nonlocal stall
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            stall = max(stall, now - last)
+            last = now
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    await asyncio.gather(*(parse(page) for page in pages))
+    elapsed = time.perf_counter() - start
+    done = True
+    await beat
+    return stall, elapsed
+
+
+async def on_loop(html: str):
+    return legacy_parse_baidu_html(html)
+
+
+async def in_pool(html: str):
+    return await run_parser(parse_baidu_html, html)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8, help="pages parsed at once for the stall test")
+    args = parser.parse_args()
+
+    for path in sorted(FIXTURES.glob("*.html")):
+        html = path.read_text(encoding="utf-8")
+        assert legacy_parse_baidu_html(html) == parse_baidu_html(html), "extractors disagree"
+
+        legacy = statistics.mean(cpu_time(legacy_parse_baidu_html, html, args.runs))
+        strained = statistics.mean(cpu_time(parse_baidu_html, html, args.runs))
+        print(f"{path.name} ({len(html) // 1024} KiB, {len(parse_baidu_html(html))} results)")
+        print(f"  {'legacy html.parser, full tree':<40}{1000 * legacy:>10.1f} ms/page")
+        print(f"  {f'{html_parsing.HTML_PARSER}, .result blocks only':<40}{1000 * strained:>10.1f} ms/page")
+
+        pages = [html] * args.concurrency
+        await in_pool(html)  # start the workers outside the measurement
+        for name, parse in (("on the event loop", on_loop), (f"pool ({html_parsing.PARSE_WORKERS} workers)", in_pool)):
+            stall, elapsed = await max_stall(parse, pages)
+            print(f"  {args.concurrency} pages {name:<28} max loop stall {1000 * stall:>7.1f} ms, wall {1000 * elapsed:>7.1f} ms")
+
+    await html_parsing.shutdown_parser_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
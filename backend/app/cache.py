@@ -0,0 +1,125 @@
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import unicodedata
+from contextlib import closing
+from collections import OrderedDict
+from typing import Any
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a user query for cache keys: NFKC, casefolded, single-spaced."""
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class TTLCache:
+    """
+    In-process LRU cache with per-entry TTL and an optional SQLite tier.
+
+    The memory tier holds at most ``max_entries`` values and evicts the least
+    recently used one when full. When ``db_path`` is set, values are also
+    written to a SQLite file so every uvicorn worker (and the next restart)
+    can reuse them; a disk hit is promoted into memory. Values must be JSON
+    serializable.
+    """
+
+    def __init__(self, name: str, max_entries: int = 1024, db_path: str | None = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.db_path = db_path
+
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        if db_path:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self._table} "
+                    "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+
+    @property
+    def _table(self) -> str:
+        return f"cache_{self.name}"
+
+    async def get(self, key: str) -> Any | None:
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return value
+            del self._entries[key]
+
+        if self.db_path:
+            row = await asyncio.to_thread(self._disk_get, key, now)
+            if row is not None:
+                expires_at, value = row
+                self._remember(key, value, expires_at)
+                self._disk_hits += 1
+                return value
+
+        self._misses += 1
+        return None
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        self._remember(key, value, expires_at)
+
+        if self.db_path:
+            await asyncio.to_thread(self._disk_set, key, value, expires_at)
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._disk_hits + self._misses
+        return {
+            "hits": self._hits,
+            "disk_hits": self._disk_hits,
+            "misses": self._misses,
+            "hit_rate": round((self._hits + self._disk_hits) / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self._evictions,
+        }
+
+    def _remember(self, key: str, value: Any, expires_at: float) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    # SQLite tier. Runs in a worker thread; one short-lived connection per
+    # call keeps it safe across threads and processes.
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=5)  # type: ignore[arg-type]
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _disk_get(self, key: str, now: float) -> tuple[float, Any] | None:
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                f"SELECT value, expires_at FROM {self._table} WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+        if row is None:
+            return None
+        return row[1], json.loads(row[0])
+
+    def _disk_set(self, key: str, value: Any, expires_at: float) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self._table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            conn.execute(f"DELETE FROM {self._table} WHERE expires_at <= ?", (time.time(),))
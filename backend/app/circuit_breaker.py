@@ -0,0 +1,111 @@
+import time
+from collections import deque
+
+
+# -----------------------------------------------
+#  Logging helper
+# -----------------------------------------------
+def log(message: str) -> None:
+    print(f"[CIRCUIT] {message}")
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker driven by error rate and latency.
+
+    The outcome of the last ``window`` calls is kept; a call is bad if it
+    failed or took ``slow_seconds`` or longer. Once at least ``min_calls``
+    are recorded and the bad share reaches ``failure_rate`` the circuit
+    opens and ``allow()`` returns False for ``open_seconds``. After that a
+    single probe call is let through (half-open): a good probe closes the
+    circuit, a bad one opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_seconds: float = 15,
+        open_seconds: float = 30,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+
+        self._outcomes: deque[bool] = deque(maxlen=window)  # True = bad
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._rejected = 0
+        self._trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            return HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probing:
+            self._state = HALF_OPEN
+            self._probing = True
+            log(f"{self.name} half-open, sending a probe")
+            return True
+        self._rejected += 1
+        return False
+
+    def record(self, ok: bool, seconds: float) -> None:
+        bad = not ok or seconds >= self.slow_seconds
+
+        if self._state == HALF_OPEN:
+            self._probing = False
+            if bad:
+                self._open()
+            else:
+                log(f"{self.name} probe succeeded, closing")
+                self._state = CLOSED
+                self._outcomes.clear()
+            return
+
+        self._outcomes.append(bad)
+        if (
+            self._state == CLOSED
+            and len(self._outcomes) >= self.min_calls
+            and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate
+        ):
+            self._open()
+
+    def release(self) -> None:
+        """
+        End a call allowed by ``allow()`` without an outcome (the caller was
+        cancelled), so a half-open probe slot is freed for the next call.
+        """
+        if self._state == HALF_OPEN:
+            self._probing = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "recent_calls": len(self._outcomes),
+            "recent_bad": sum(self._outcomes),
+            "trips": self._trips,
+            "rejected": self._rejected,
+        }
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._trips += 1
+        log(f"{self.name} open for {self.open_seconds}s")
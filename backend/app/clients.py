@@ -1,3 +1,103 @@
+import os
+import random
+
 import httpx
 
-client: httpx.AsyncClient | None = None
\ No newline at end of file
+
+# -----------------------------------------------
+#  Logging helper
+# -----------------------------------------------
+def log(message: str) -> None:
+    print(f"[HTTP] {message}")
+
+
+# Pool settings shared by every outbound client. HTTP/2 multiplexes requests
+# to the same host over one connection; it needs the ``h2`` package
+# (httpx[http2]) and falls back to HTTP/1.1 keep-alive without it.
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2 = os.getenv("HTTP2", "1") == "1"
+
+try:
+    import h2  # noqa: F401
+    _HAS_H2 = True
+except ImportError:
+    _HAS_H2 = False
+
+if HTTP2 and not _HAS_H2:
+    log("h2 not installed, outbound clients use HTTP/1.1")
+
+# Bright Data (SERP, datasets, snapshots); created and closed by main.lifespan
+client: httpx.AsyncClient | None = None
+
+_pools: dict[str, httpx.AsyncClient] = {}
+_requests: dict[str, int] = {}
+
+
+def new_client(name: str, timeout: httpx.Timeout) -> httpx.AsyncClient:
+    """
+    Pooled async client registered under ``name`` for ``pool_stats``.
+
+    Every outbound client is built here so keep-alive, connection limits
+    and HTTP/2 are configured in one place.
+    """
+
+    async def count(request: httpx.Request) -> None:
+        _requests[name] = _requests.get(name, 0) + 1
+
+    pool = httpx.AsyncClient(
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        http2=HTTP2 and _HAS_H2,
+        event_hooks={"request": [count]},
+    )
+    _pools[name] = pool
+    return pool
+
+
+# OpenAI (chat and embeddings). Built at import because the model wrappers
+# take their HTTP client when they are constructed; connections are still
+# only opened on first use. It lives as long as the process, so close_all
+# leaves it open for the wrappers that keep holding it.
+llm_client = new_client("openai", httpx.Timeout(60, connect=5, pool=10))
+
+
+async def close_all() -> None:
+    """Close the pools created for one app lifespan (everything but ``llm_client``)."""
+    global client
+    for name, pool in list(_pools.items()):
+        if pool is llm_client:
+            continue
+        await pool.aclose()
+        del _pools[name]
+    client = None
+
+
+def pool_stats() -> dict:
+    stats = {}
+    for name, pool in _pools.items():
+        # httpx has no public pool API; read httpcore's connection list
+        connections = getattr(getattr(pool._transport, "_pool", None), "connections", [])
+        idle = sum(1 for conn in connections if conn.is_idle())
+        stats[name] = {
+            "requests": _requests.get(name, 0),
+            "connections": len(connections),
+            "active": len(connections) - idle,
+            "idle": idle,
+            "http2": sum(1 for conn in connections if "HTTP/2" in conn.info()),
+            "max_connections": HTTP_MAX_CONNECTIONS,
+        }
+    return stats
+
+
+def jittered(delay: float) -> float:
+    """
+    Spread a backoff delay over [delay/2, delay] ("equal jitter") so that
+    concurrent callers retrying the same upstream do not wake up in lockstep.
+    """
+    return delay / 2 + random.uniform(0, delay / 2)
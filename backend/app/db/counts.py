@@ -0,0 +1,65 @@
+import time
+import threading
+from sqlalchemy import func, text
+from sqlmodel import Session, SQLModel, select
+
+
+# -----------------------------------------------
+#  Logging helper
+# -----------------------------------------------
+def log(message: str) -> None:
+    print(f"[ROW COUNT] {message}")
+
+
+class CachedRowCount:
+    """
+    Row count of one table, refreshed at most every ``ttl`` seconds.
+
+    On SQL Server the count comes from partition metadata, which is
+    approximate but does not scan the table; elsewhere (or without the
+    VIEW DATABASE STATE permission) it falls back to ``COUNT(*)``. Inserts
+    made by this process are added with ``bump`` between refreshes.
+    """
+
+    def __init__(self, model: type[SQLModel], ttl: float = 60):
+        self.model = model
+        self.ttl = ttl
+
+        self._value: int | None = None
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._use_metadata = True
+
+    def get(self, engine) -> int:
+        if self._value is None or time.monotonic() - self._refreshed_at >= self.ttl:
+            # One thread refreshes; the others keep serving the old value
+            if self._lock.acquire(blocking=self._value is None):
+                try:
+                    self._value = self._count(engine)
+                    self._refreshed_at = time.monotonic()
+                finally:
+                    self._lock.release()
+        return self._value  # type: ignore[return-value]
+
+    def bump(self, rows: int = 1) -> None:
+        if self._value is not None:
+            self._value += rows
+
+    def _count(self, engine) -> int:
+        with Session(engine) as session:
+            if engine.dialect.name == "mssql" and self._use_metadata:
+                try:
+                    rows = session.connection().execute(
+                        text(
+                            "SELECT SUM(row_count) FROM sys.dm_db_partition_stats "
+                            "WHERE object_id = OBJECT_ID(:table) AND index_id IN (0, 1)"
+                        ),
+                        {"table": self.model.__tablename__},
+                    ).scalar()
+                    return int(rows or 0)
+                except Exception as e:
+                    log(f"Partition stats unavailable, using COUNT(*): {e}")
+                    self._use_metadata = False
+                    session.rollback()
+
+            return session.exec(select(func.count()).select_from(self.model)).one()
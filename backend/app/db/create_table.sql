@@ -1,6 +1,32 @@
 CREATE TABLE PromptResult (
-    Id INT IDENTITY(1,1) PRIMARY KEY,
+    Id INT IDENTITY(1,1) CONSTRAINT PK_PromptResult PRIMARY KEY,
     Prompt NVARCHAR(MAX),
     Results NVARCHAR(MAX),
+    Preview NVARCHAR(300) NULL,
+    Sources_Skipped NVARCHAR(MAX) NULL,
     CreatedAt DATETIME DEFAULT GETDATE()
 );
+
+CREATE INDEX IX_PromptResult_CreatedAt_Id ON PromptResult (CreatedAt DESC, Id DESC);
+
+
+CREATE TABLE QueryJob (
+    Id NVARCHAR(32) PRIMARY KEY,
+    Prompt NVARCHAR(MAX) NOT NULL,
+    Latency_Budget FLOAT NULL,
+    Status NVARCHAR(16) NOT NULL DEFAULT 'queued',
+    Result_Id INT NULL REFERENCES PromptResult(Id),
+    Error NVARCHAR(MAX) NULL,
+    CreatedAt DATETIME NOT NULL DEFAULT GETDATE(),
+    UpdatedAt DATETIME NOT NULL DEFAULT GETDATE()
+);
+
+CREATE INDEX IX_QueryJob_Status ON QueryJob (Status);
+
+
+-- Optional: SQL Server full-text index used by /api/search (requires the
+-- Full-Text Search feature). Without it the app falls back to its in-process index.
+-- CREATE FULLTEXT CATALOG PromptResultCatalog;
+-- CREATE FULLTEXT INDEX ON PromptResult (Prompt, Results)
+--     KEY INDEX PK_PromptResult ON PromptResultCatalog
+--     WITH CHANGE_TRACKING AUTO;
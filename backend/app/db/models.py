@@ -1,9 +1,37 @@
 from sqlmodel import SQLModel, Field
-from typing import Optional
+from sqlalchemy import JSON, Index, event
+from .types import CompressedText, make_preview
+from typing import List, Optional
 from datetime import datetime, timezone
+from uuid import uuid4
 
 class PromptResult(SQLModel, table=True):
+    # Serves the newest-first history listing and its (createdAt, id) cursor
+    __table_args__ = (Index("ix_promptresult_createdAt_id", "createdAt", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     prompt: str
-    results: str
+    results: str = Field(sa_type=CompressedText)
+    # Short plain-text start of the answer; lets listings skip the full body
+    preview: Optional[str] = Field(default=None, max_length=300)
+    # Sources left out because the latency budget ran out; NULL when complete
+    sources_skipped: Optional[List[str]] = Field(default=None, sa_type=JSON(none_as_null=True))
+    createdAt: datetime = Field(default_factory=lambda: datetime.now(), nullable=False)
+
+
+@event.listens_for(PromptResult, "before_insert")
+def _set_preview(mapper, connection, target: PromptResult) -> None:
+    if target.preview is None:
+        target.preview = make_preview(target.results)
+
+
+class QueryJob(SQLModel, table=True):
+    # queued -> running -> succeeded | failed | cancelled
+    id: str = Field(default_factory=lambda: uuid4().hex, primary_key=True, max_length=32)
+    prompt: str
+    latency_budget: Optional[float] = None
+    status: str = Field(default="queued", max_length=16, index=True)
+    result_id: Optional[int] = Field(default=None, foreign_key="promptresult.id")
+    error: Optional[str] = None
     createdAt: datetime = Field(default_factory=lambda: datetime.now(), nullable=False)
+    updatedAt: datetime = Field(default_factory=lambda: datetime.now(), nullable=False)
@@ -0,0 +1,45 @@
+import os
+import re
+import zlib
+import base64
+from sqlalchemy.types import TypeDecorator
+from sqlmodel.sql.sqltypes import AutoString
+
+# Values at least this long (characters) are stored compressed; 0 disables it
+COMPRESS_MIN_LENGTH = int(os.getenv("RESULTS_COMPRESS_MIN", "2048"))
+
+# Private-use code point: cannot start a real answer, so plain values written
+# before compression existed are read back unchanged.
+_MARKER = "z:"
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text column that stores long values zlib-compressed (base64, behind a
+    marker prefix) in the same NVARCHAR column.
+
+    Compression happens when a value is written and decompression when the
+    column is loaded, so models keep seeing plain ``str``. Queries that do
+    not select the column never pay for decompression.
+    """
+
+    impl = AutoString
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or not COMPRESS_MIN_LENGTH or len(value) < COMPRESS_MIN_LENGTH:
+            return value
+        packed = _MARKER + base64.b64encode(zlib.compress(value.encode("utf-8"), 6)).decode("ascii")
+        # Incompressible text (already-compressed data, mostly) stays as it is
+        return packed if len(packed) < len(value) else value
+
+    def process_result_value(self, value, dialect):
+        if value is None or not value.startswith(_MARKER):
+            return value
+        return zlib.decompress(base64.b64decode(value[len(_MARKER):])).decode("utf-8")
+
+
+def make_preview(text: str, length: int = 200) -> str:
+    """First ``length`` characters of ``text`` on one line, for history listings."""
+    flat = re.sub(r"\s+", " ", text or "").strip()
+    return flat if len(flat) <= length else flat[: length - 1].rstrip() + "…"
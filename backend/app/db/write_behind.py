@@ -0,0 +1,101 @@
+import asyncio
+from sqlmodel import SQLModel
+from db.session import run_db, insert_rows
+
+
+# -----------------------------------------------
+#  Logging helper
+# -----------------------------------------------
+def log(message: str) -> None:
+    print(f"[WRITE BEHIND] {message}")
+
+
+class WriteBehindWriter:
+    """
+    Batches row inserts into multi-row transactions.
+
+    ``add`` queues a row and returns once the batch holding it is committed,
+    so callers still get the generated id. A background task takes up to
+    ``max_batch`` rows at a time, waiting at most ``max_delay`` seconds for a
+    batch to fill, and commits each batch in a single transaction on the DB
+    thread pool. Under concurrency many requests share one round-trip.
+    """
+
+    def __init__(self, engine, max_batch: int = 50, max_delay: float = 0.05):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        self._queue: asyncio.Queue[tuple[SQLModel, asyncio.Future] | None] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self._batches = 0
+        self._rows = 0
+        self._largest_batch = 0
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="write-behind")
+
+    async def stop(self) -> None:
+        """Commit everything already queued, then stop."""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def add(self, row: SQLModel) -> SQLModel:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, future))
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "batches": self._batches,
+            "rows": self._rows,
+            "largest_batch": self._largest_batch,
+            "queued": self._queue.qsize(),
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple[SQLModel, asyncio.Future]]) -> None:
+        try:
+            await run_db(insert_rows, self.engine, [row for row, _ in batch])
+        except Exception as e:
+            log(f"Batch of {len(batch)} rows failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self._batches += 1
+        self._rows += len(batch)
+        self._largest_batch = max(self._largest_batch, len(batch))
+        for row, future in batch:
+            if not future.done():
+                future.set_result(row)
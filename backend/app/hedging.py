@@ -0,0 +1,100 @@
+import time
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class Hedger:
+    """
+    Hedged requests for one idempotent upstream.
+
+    ``run(send)`` starts ``send()``; if it has not finished after the
+    ``quantile`` of recently observed latencies, a second identical request
+    is started and the first to finish successfully wins, the other is
+    cancelled. ``success`` decides what counts: a result that fails it (say
+    a 429) never beats a request still in flight, and only successful
+    latencies feed the hedge delay. Hedges are only issued while they stay under ``max_rate`` of all
+    requests, and not before ``min_samples`` latencies have been seen, so
+    extra load stays bounded.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_rate: float = 0.1,
+        quantile: float = 0.9,
+        window: int = 200,
+        min_samples: int = 20,
+    ):
+        self.name = name
+        self.max_rate = max_rate
+        self.quantile = quantile
+        self.min_samples = min_samples
+
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._requests = 0
+        self._hedges = 0
+        self._hedges_won = 0
+
+    def hedge_delay(self) -> float | None:
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))]
+
+    async def run(
+        self,
+        send: Callable[[], Awaitable[T]],
+        success: Callable[[T], bool] = lambda result: True,
+    ) -> T:
+        self._requests += 1
+        primary = asyncio.ensure_future(self._timed(send, success))
+
+        delay = self.hedge_delay()
+        if delay is None or self._hedges >= self.max_rate * self._requests:
+            return await primary
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+
+            self._hedges += 1
+            hedge = asyncio.ensure_future(self._timed(send, success))
+            tasks.add(hedge)
+
+            # First successful response wins; a failure only counts if both fail
+            while True:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and success(task.result()):
+                        if task is hedge:
+                            self._hedges_won += 1
+                        return task.result()
+                if not tasks:
+                    # Both failed: prefer an unsuccessful response over an exception
+                    finished = [task for task in (primary, hedge) if task.exception() is None]
+                    return (finished or list(done))[0].result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        delay = self.hedge_delay()
+        return {
+            "requests": self._requests,
+            "hedges": self._hedges,
+            "hedges_won": self._hedges_won,
+            "hedge_rate": round(self._hedges / self._requests, 3) if self._requests else 0.0,
+            "hedge_after_ms": round(1000 * delay, 1) if delay is not None else None,
+        }
+
+    async def _timed(self, send: Callable[[], Awaitable[T]], success: Callable[[T], bool]) -> T:
+        started = time.monotonic()
+        result = await send()
+        if success(result):
+            self._latencies.append(time.monotonic() - started)
+        return result
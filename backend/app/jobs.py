@@ -0,0 +1,255 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict
+from sqlmodel import Session, select, update
+from db.models import QueryJob
+from db.session import run_db
+
+
+# -----------------------------------------------
+#  Logging helper
+# -----------------------------------------------
+def log(message: str) -> None:
+    print(f"[JOBS] {message}")
+
+
+class QueueFullError(Exception):
+    pass
+
+
+ACTIVE = ("queued", "running")
+
+
+class JobRunner:
+    """
+    Background execution of /api/query work with persisted job state.
+
+    Submitted jobs are stored as ``QueryJob`` rows and processed by a fixed
+    pool of ``workers`` tasks, so at most that many graph runs execute at
+    once no matter how many jobs are queued.
+
+    Several processes (uvicorn workers) may share the table. A job is
+    claimed by moving it from queued to running in one locked update, so
+    only one process runs it. A running job's ``updatedAt`` is refreshed
+    every ``lease / 3`` seconds; if renewals keep failing until the lease
+    would lapse, the job is stopped here. On ``start()`` and every ``lease`` seconds
+    after it, queued jobs and running jobs whose lease expired (their
+    process died) are picked up again. A process that shuts down puts its
+    running jobs back in the queue.
+
+    ``run`` receives ``(prompt, latency_budget)`` and returns the stored
+    PromptResult as a dict (or None when no answer was produced).
+    """
+
+    def __init__(
+        self,
+        engine,
+        run: Callable[[str, float | None], Awaitable[Dict[str, Any] | None]],
+        workers: int = 2,
+        max_queued: int = 100,
+        lease: float = 60.0,
+    ):
+        self.engine = engine
+        self.run = run
+        self.workers = workers
+        self.max_queued = max_queued
+        self.lease = lease
+
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._queued: set[str] = set()
+        self._worker_tasks: list[asyncio.Task] = []
+        self._sweeper: asyncio.Task | None = None
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancel_requested: set[str] = set()
+
+    async def start(self) -> None:
+        recovered = await self._sweep()
+        if recovered:
+            log(f"Re-queued {recovered} unfinished jobs")
+
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._sweeper = asyncio.create_task(self._sweep_loop(), name="job-sweeper")
+        log(f"Started {self.workers} workers")
+
+    async def stop(self) -> None:
+        tasks = [*self._worker_tasks, *([self._sweeper] if self._sweeper else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._sweeper = None
+
+    async def submit(self, prompt: str, latency_budget: float | None = None) -> QueryJob:
+        if self._queue.qsize() >= self.max_queued:
+            raise QueueFullError(f"{self._queue.qsize()} jobs already queued")
+
+        job = await run_db(self._insert, QueryJob(prompt=prompt, latency_budget=latency_budget))
+        self._enqueue(job.id)
+        return job
+
+    async def get(self, job_id: str) -> QueryJob | None:
+        return await run_db(self._get, job_id)
+
+    async def cancel(self, job_id: str) -> QueryJob | None:
+        job = await self.get(job_id)
+        if job is None or job.status not in ACTIVE:
+            return job
+
+        task = self._running.get(job_id)
+        if task is not None:
+            self._cancel_requested.add(job_id)
+            task.cancel()
+
+        # A queued job is skipped by the worker that eventually dequeues it
+        return await self._update(job_id, ACTIVE, status="cancelled") or await self.get(job_id)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "running": len(self._running),
+        }
+
+    def _enqueue(self, job_id: str) -> None:
+        if job_id not in self._queued and job_id not in self._running:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _sweep(self) -> int:
+        """Queue every claimable job this process does not hold yet; returns how many."""
+        job_ids = [
+            job_id for job_id in await run_db(self._recover)
+            if job_id not in self._queued and job_id not in self._running
+        ]
+        for job_id in job_ids:
+            self._enqueue(job_id)
+        return len(job_ids)
+
+    async def _sweep_loop(self) -> None:
+        # Picks up jobs of processes that died while this one keeps running
+        while True:
+            await asyncio.sleep(self.lease)
+            try:
+                await self._sweep()
+            except Exception as e:
+                log(f"Job sweep failed: {e}")
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self._process(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id: str) -> None:
+        job = await self.get(job_id)
+        if job is None or job.status not in ACTIVE:
+            return
+
+        # Claim the job; fails if another process claimed or cancelled it first
+        if await self._update(job_id, ("queued",), status="running") is None:
+            return
+        task = asyncio.create_task(self.run(job.prompt, job.latency_budget))
+        self._running[job_id] = task
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, task))
+
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if job_id not in self._cancel_requested:
+                # The worker itself is shutting down; hand the job back so
+                # another process (or the next start) runs it.
+                await self._update(job_id, ("running",), status="queued")
+                raise
+            log(f"Job {job_id} cancelled")
+            return
+        except Exception as e:
+            log(f"Job {job_id} failed: {e}")
+            await self._update(job_id, ("running",), status="failed", error=str(e))
+            return
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job_id, None)
+            self._cancel_requested.discard(job_id)
+
+        if result is None:
+            await self._update(job_id, ("running",), status="failed", error="No answer produced")
+        else:
+            await self._update(job_id, ("running",), status="succeeded", result_id=result.get("id"))
+
+    async def _heartbeat(self, job_id: str, task: asyncio.Task) -> None:
+        # Renew the lease; a job that is no longer running was cancelled,
+        # possibly through another process. Failed renewals are retried on
+        # the next beat; if the lease would expire before that, the job is
+        # stopped here since the sweep is about to hand it to another worker.
+        loop = asyncio.get_running_loop()
+        renewed = loop.time()
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                job = await self._update(job_id, ("running",))
+            except Exception as e:
+                log(f"Lease renewal for job {job_id} failed: {e}")
+                if loop.time() + self.lease / 3 < renewed + self.lease:
+                    continue
+                log(f"Job {job_id} stopped: its lease expires before the next renewal")
+                job = None
+            if job is None:
+                self._cancel_requested.add(job_id)
+                task.cancel()
+                return
+            renewed = loop.time()
+
+    async def _update(self, job_id: str, only_from: tuple[str, ...], **values: Any) -> QueryJob | None:
+        """Apply ``values`` if the job's status is in ``only_from``; None otherwise."""
+        return await run_db(self._apply_update, job_id, only_from, values)
+
+    # Blocking helpers, run via run_db
+    def _insert(self, job: QueryJob) -> QueryJob:
+        with Session(self.engine, expire_on_commit=False) as session:
+            session.add(job)
+            session.commit()
+            return job
+
+    def _get(self, job_id: str) -> QueryJob | None:
+        with Session(self.engine) as session:
+            return session.get(QueryJob, job_id)
+
+    def _apply_update(
+        self, job_id: str, only_from: tuple[str, ...], values: Dict[str, Any]
+    ) -> QueryJob | None:
+        # One conditional UPDATE, so the status check and the write are atomic
+        # across processes on every database
+        with Session(self.engine) as session:
+            applied = session.exec(
+                update(QueryJob)
+                .where(QueryJob.id == job_id, QueryJob.status.in_(only_from))  # type: ignore[arg-type, attr-defined]
+                .values(**values, updatedAt=datetime.now())
+            )
+            session.commit()
+            if applied.rowcount == 0:
+                return None
+            return session.get(QueryJob, job_id)
+
+    def _recover(self) -> list[str]:
+        with Session(self.engine) as session:
+            # Running jobs whose lease expired lost their process: queue them again
+            expired = datetime.now() - timedelta(seconds=self.lease)
+            session.exec(
+                update(QueryJob)
+                .where(QueryJob.status == "running", QueryJob.updatedAt < expired)  # type: ignore[arg-type]
+                .values(status="queued", updatedAt=datetime.now())
+            )
+            session.commit()
+
+            statement = (
+                select(QueryJob.id)
+                .where(QueryJob.status == "queued")  # type: ignore[arg-type]
+                .order_by(QueryJob.createdAt)  # type: ignore[arg-type]
+            )
+            return list(session.exec(statement).all())
@@ -0,0 +1,138 @@
+import os
+import time
+import asyncio
+
+
+# -----------------------------------------------
+#  Logging helper
+# -----------------------------------------------
+def log(message: str) -> None:
+    print(f"[LIMITS] {message}")
+
+
+class Limiter:
+    """
+    Concurrency cap plus token-bucket rate limit for one upstream.
+
+    ``async with limiter:`` waits for a free slot (at most ``max_concurrency``
+    calls in flight) and then for a token (``rate`` per second, bursts of up
+    to ``burst``). Both waits are first come, first served, so callers queue
+    instead of failing. ``pause`` stops handing out tokens for a while and
+    then lets a single call through, which is how a 429 from the upstream
+    slows every caller down, not just the one that got it. A limit of 0
+    disables that part.
+    """
+
+    def __init__(self, name: str, max_concurrency: int = 0, rate: float = 0, burst: float | None = None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1)
+
+        self._slots = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self._bucket_lock = asyncio.Lock()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+        self._waiting = 0
+        self._active = 0
+        self._acquired = 0
+        self._throttled = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    async def __aenter__(self) -> "Limiter":
+        started = time.monotonic()
+        self._waiting += 1
+        try:
+            if self._slots is not None:
+                await self._slots.acquire()
+            try:
+                await self._take_token()
+            except BaseException:
+                if self._slots is not None:
+                    self._slots.release()
+                raise
+        finally:
+            self._waiting -= 1
+
+        waited = time.monotonic() - started
+        self._acquired += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+        self._active += 1
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._active -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for ``seconds`` (e.g. a 429's Retry-After)."""
+        self._throttled += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        # One call goes through when the pause ends; the rest follow at ``rate``
+        self._tokens = 1
+        self._updated = self._paused_until
+        log(f"{self.name} throttled for {seconds:.1f}s")
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "rate": self.rate,
+            "waiting": self._waiting,
+            "active": self._active,
+            "acquired": self._acquired,
+            "throttled": self._throttled,
+            "avg_wait_ms": round(1000 * self._total_wait / self._acquired, 1) if self._acquired else 0.0,
+            "max_wait_ms": round(1000 * self._max_wait, 1),
+        }
+
+    async def _take_token(self) -> None:
+        # The lock is FIFO, so waiters get tokens in arrival order
+        async with self._bucket_lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if not self.rate:
+                    return
+
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# Defaults per upstream: (max concurrency, requests per second). Override with
+# LIMIT_<NAME>_CONCURRENCY / LIMIT_<NAME>_RPS, e.g. LIMIT_OPENAI_RPS=5.
+DEFAULT_LIMITS = {
+    "brightdata-serp": (10, 5.0),
+    "brightdata-datasets": (4, 2.0),
+    "openai": (8, 8.0),
+}
+
+_limiters: dict[str, Limiter] = {}
+
+
+def get_limiter(name: str) -> Limiter:
+    limiter = _limiters.get(name)
+    if limiter is None:
+        concurrency, rate = DEFAULT_LIMITS.get(name, (0, 0.0))
+        prefix = "LIMIT_" + name.upper().replace("-", "_")
+        limiter = Limiter(
+            name,
+            max_concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency))),
+            rate=float(os.getenv(f"{prefix}_RPS", str(rate))),
+        )
+        _limiters[name] = limiter
+    return limiter
+
+
+def limiter_stats() -> dict:
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
@@ -1,14 +1,37 @@
-from fastapi import FastAPI, Depends, Query
+from fastapi import FastAPI, Depends, Query, Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
-from db.models import PromptResult, SQLModel
-from db.session import engine, get_session
+from db.models import PromptResult, QueryJob, SQLModel
+from db.session import engine, get_session, run_db, insert_rows
+from db.write_behind import WriteBehindWriter
+from db.counts import CachedRowCount
+from db.types import COMPRESS_MIN_LENGTH
+from sqlalchemy import and_, or_
 from agents.agent_manager import run_agents
 from fastapi.middleware.cors import CORSMiddleware
-from agents.ai_agents.ai_agent_search import run_chatbot
+from agents.ai_agents.ai_agent_search import stream_chatbot, ChatbotResult, llm
+from agents.ai_agents.snapshot_poller import snapshot_poller
+from agents.ai_agents.html_parsing import PARSE_WORKERS, start_parser_pool, shutdown_parser_pool
+from agents.ai_agents.serp_merge import serp_merger
+from agents.ai_agents.token_budget import warm_tokenizer
+from agents.ai_agents.web_operations import serp_cache, serp_flight, snapshot_flight, serp_breakers, serp_hedgers, trigger_batcher
+from semantic_cache import semantic_index
+from search_index import history_index, has_fulltext_index, fulltext_search
+from singleflight import SingleFlight, EventBroadcast
+from limits import limiter_stats
+from cache import normalize_query
+from jobs import JobRunner, QueueFullError
 from contextlib import asynccontextmanager
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict
 import clients
 import os
 import httpx
+import json
+import base64
+import hmac
+import asyncio
 
 # -----------------------------------------------
 #  Logging helper
@@ -17,6 +40,65 @@ def log(message: str) -> None:
     print(f"[STARTUP] {message}")
 
     
+async def build_semantic_index() -> None:
+    if semantic_index is None:
+        return
+    try:
+        await semantic_index.build_from_db(engine)
+    except Exception as e:
+        log(f"Semantic index build failed: {e}")
+
+
+async def build_history_index(app: FastAPI) -> None:
+    # SQL Server full-text search when the table has a full-text index,
+    # otherwise the in-process BM25 index. The full-text index can't read
+    # compressed answers, so BM25 is used whenever compression is on.
+    try:
+        app.state.fulltext = await run_db(has_fulltext_index, engine)
+        if app.state.fulltext and COMPRESS_MIN_LENGTH:
+            log("Full-text index ignored: answers are compressed (RESULTS_COMPRESS_MIN > 0), using BM25")
+            app.state.fulltext = False
+        if app.state.fulltext:
+            log("History search uses the SQL Server full-text index")
+        else:
+            await history_index.build_from_db(engine)
+    except Exception as e:
+        log(f"History index build failed: {e}")
+
+
+# Each worker process keeps its own in-memory indexes and only adds the rows
+# it saves itself, so rows written by other workers are picked up by a
+# periodic catch-up. 0 disables it.
+INDEX_REFRESH_SECONDS = float(os.getenv("INDEX_REFRESH_SECONDS", "30"))
+
+# Identity values are assigned before commit, so a row can become visible
+# after one with a higher id; rescanning a few ids back catches those (adds
+# skip rows that are already indexed)
+INDEX_REFRESH_OVERLAP = 100
+
+
+async def refresh_indexes(app: FastAPI, *startup_tasks: asyncio.Task) -> None:
+    await asyncio.gather(*startup_tasks, return_exceptions=True)
+    while True:
+        await asyncio.sleep(INDEX_REFRESH_SECONDS)
+        if not app.state.fulltext:
+            try:
+                after_id = max(0, history_index.last_id - INDEX_REFRESH_OVERLAP)
+                added = await history_index.catch_up(engine, after_id)
+                if added:
+                    log(f"History index caught up {added} results")
+            except Exception as e:
+                log(f"History index refresh failed: {e}")
+        if semantic_index is not None:
+            try:
+                after_id = max(0, semantic_index.last_id - INDEX_REFRESH_OVERLAP)
+                added = await semantic_index.catch_up(engine, after_id)
+                if added:
+                    log(f"Semantic index caught up {added} prompts")
+            except Exception as e:
+                log(f"Semantic index refresh failed: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     
@@ -36,26 +118,104 @@ async def lifespan(app: FastAPI):
     else:
         log(f"ENV={ENV} - skipping database creation")  
 
-    clients.client = httpx.AsyncClient(timeout=timeout)
+    # Before anything below starts threads
+    if PARSE_WORKERS > 0:
+        start_parser_pool()
+
+    clients.client = clients.new_client("brightdata", timeout)
     app.state.http = clients.client
     
     log("HTTP client created")
 
+    snapshot_poller.start()
+    log("Snapshot poller started")
+
+    # tiktoken may download its encoding; token counts are estimated until then
+    tokenizer_task = asyncio.create_task(asyncio.to_thread(warm_tokenizer))
+
+    # Index past prompts in the background; lookups use whatever is indexed so far
+    index_task = asyncio.create_task(build_semantic_index())
+    app.state.fulltext = False
+    history_task = asyncio.create_task(build_history_index(app))
+    refresh_task = (
+        asyncio.create_task(refresh_indexes(app, index_task, history_task))
+        if INDEX_REFRESH_SECONDS > 0
+        else None
+    )
+
+    if prompt_writer is not None:
+        prompt_writer.start()
+        log("Write-behind PromptResult writer started")
+
+    await job_runner.start()
+    log("Job runner started")
+
     try:
         yield
     finally:
         # ─── SHUTDOWN ─────────────────────────
-        await clients.client.aclose()
-        log("HTTP client closed")
+        tokenizer_task.cancel()
+        index_task.cancel()
+        history_task.cancel()
+        if refresh_task is not None:
+            refresh_task.cancel()
+        await job_runner.stop()
+        if prompt_writer is not None:
+            await prompt_writer.stop()
+        await snapshot_poller.stop()
+        await shutdown_parser_pool()
+        await clients.close_all()
+        log("HTTP clients closed")
         log("App shutting down")
         
 app = FastAPI(lifespan=lifespan)
 
+query_flight = SingleFlight("query")
+
+# Progress events of the graph run behind each query_flight key, so SSE
+# clients that join an identical in-flight prompt can follow it too
+query_streams: dict[str, EventBroadcast] = {}
+
+# PROMPT_WRITE_BEHIND=1 batches PromptResult inserts from concurrent requests
+# into shared transactions instead of one commit per answer.
+prompt_writer = (
+    WriteBehindWriter(
+        engine,
+        max_batch=int(os.getenv("PROMPT_WRITE_BATCH", "50")),
+        max_delay=float(os.getenv("PROMPT_WRITE_DELAY", "0.05")),
+    )
+    if os.getenv("PROMPT_WRITE_BEHIND", "0") == "1"
+    else None
+)
+
 @app.get("/")
 def health():
     return {"status": "ok"}
 
 
+@app.get("/api/metrics")
+def metrics():
+    return {
+        "serp_cache": serp_cache.stats(),
+        "llm_cache": llm.stats(),
+        "snapshot_poller": snapshot_poller.stats(),
+        "snapshot_batches": trigger_batcher.stats(),
+        "serp_merge": serp_merger.stats(),
+        "semantic_cache": semantic_index.stats() if semantic_index else None,
+        "singleflight": {
+            flight.name: flight.stats()
+            for flight in (query_flight, serp_flight, snapshot_flight)
+        },
+        "jobs": job_runner.stats(),
+        "prompt_writer": prompt_writer.stats() if prompt_writer else None,
+        "history_index": history_index.stats(),
+        "limits": limiter_stats(),
+        "circuit_breakers": {engine: b.stats() for engine, b in serp_breakers.items()},
+        "hedging": {engine: h.stats() for engine, h in serp_hedgers.items()},
+        "http_pools": clients.pool_stats(),
+    }
+
+
 # Allow frontend (localhost:3000) to talk to backend (localhost:8000)
 app.add_middleware(
     CORSMiddleware,
@@ -65,48 +225,341 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-async def shutdown():
-    if clients.client is not None:
-        await clients.client.aclose()
+@app.post("/api/query")
+async def query_agents(prompt: str,
+                       latency_budget: float | None = Query(None, gt=0)):
+    return await handle_query(prompt, latency_budget)
 
 
-@app.post("/api/query")
-async def query_agents(prompt: str, session: Session = Depends(get_session)):
-    results =  await run_chatbot(prompt) 
+async def handle_query(prompt: str, latency_budget: float | None = None):
+    cached = await semantic_hit(prompt)
+    if cached is not None:
+        return cached
+
+    # Identical prompts submitted concurrently share one graph run and one record
+    return await query_flight.do(
+        normalize_query(prompt), lambda: answer_prompt(prompt, latency_budget)
+    )
+
+
+async def semantic_hit(prompt: str):
+    """A near-duplicate of an earlier prompt is answered from history."""
+    if semantic_index is None:
+        return None
+
+    try:
+        match = await semantic_index.lookup(prompt)
+    except Exception as e:
+        # No embedding, no reuse: treat it as a miss and run the graph
+        log(f"Semantic lookup failed: {e}")
+        return None
+    if match is None:
+        return None
+
+    cached_record = await run_db(get_prompt_result, match[0])
+    if cached_record is None:
+        return None
+
+    return {
+        **cached_record.model_dump(),
+        "semantic_match": {"id": match[0], "similarity": round(match[1], 4)},
+    }
+
+
+async def answer_prompt(prompt: str, latency_budget: float | None = None):
+    # Runs once per query_flight key; its progress goes to every subscriber
+    key = normalize_query(prompt)
+    stream = query_streams.setdefault(key, EventBroadcast())
+    stream.active = True
+    results = None
+    try:
+        async for event in stream_chatbot(prompt, latency_budget):
+            if event["event"] == "answer":
+                results = ChatbotResult.model_validate(event)
+            else:
+                stream.publish(event)
+    finally:
+        stream.active = False
+        if query_streams.get(key) is stream:
+            del query_streams[key]
+
     #results =  run_agents(prompt)  # multi-agent logic
     if results is None:
         return results
-    record = PromptResult(prompt=prompt, results=results)
-    session.add(record)
-    session.commit()
-    session.refresh(record)
-    return record
+    return await save_result(prompt, results)
+
+
+async def save_result(prompt: str, results: ChatbotResult):
+    record = PromptResult(
+        prompt=prompt,
+        results=results.answer,
+        sources_skipped=results.sources_skipped or None,
+    )
+    if prompt_writer is not None:
+        await prompt_writer.add(record)
+    else:
+        await run_db(insert_rows, engine, [record])
+    result_count.bump()
+    history_index.add(record.id, record.prompt, record.results)  # type: ignore[arg-type]
+
+    # A partial answer (sources skipped after the latency budget ran out) is
+    # not offered for reuse; the next similar prompt gets a full run
+    if semantic_index is not None and not results.sources_skipped:
+        # The answer is already stored; failing to index it only costs future reuse
+        try:
+            await semantic_index.add([record.id], [record.prompt])  # type: ignore[list-item]
+        except Exception as e:
+            log(f"Semantic index add failed for {record.id}: {e}")
+
+    return {
+        **record.model_dump(),
+        "sources_included": results.sources_included,
+        "sources_skipped": results.sources_skipped,
+    }
+
+
+def get_prompt_result(record_id: int) -> PromptResult | None:
+    with Session(engine) as session:
+        return session.get(PromptResult, record_id)
+
+
+def get_prompt_results(record_ids: list[int]) -> list[PromptResult]:
+    with Session(engine) as session:
+        statement = select(PromptResult).where(PromptResult.id.in_(record_ids))  # type: ignore[union-attr]
+        return list(session.exec(statement).all())
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+@app.get("/api/query/stream")
+async def stream_query(prompt: str,
+                       latency_budget: float | None = Query(None, gt=0)):
+    """
+    Server-sent events version of /api/query: node_start / node_end per graph
+    node, token chunks of the synthesized answer, then the stored record as
+    ``result`` and a closing ``done``.
+    """
+    return StreamingResponse(
+        query_events(prompt, latency_budget),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def query_events(prompt: str, latency_budget: float | None):
+    # Sent right away so the client knows the request is being worked on
+    yield sse("start", {"prompt": prompt})
+
+    try:
+        cached = await semantic_hit(prompt)
+        if cached is not None:
+            yield sse("result", cached)
+        else:
+            async for event in follow_query(prompt, latency_budget):
+                if event["event"] == "result":
+                    yield sse("result", event["record"])
+                else:
+                    yield sse(event["event"], event)
+    except Exception as e:
+        log(f"Streaming query failed: {e}")
+        yield sse("error", {"detail": str(e)})
+
+    yield sse("done", {})
+
+
+async def follow_query(prompt: str, latency_budget: float | None):
+    """
+    Progress events of the shared graph run for ``prompt``, then the stored
+    record as a ``result`` event (under ``record``). Identical concurrent prompts (streamed or
+    not) join one run through query_flight, which alone saves the record.
+    """
+    key = normalize_query(prompt)
+    stream = query_streams.setdefault(key, EventBroadcast())
+    events = stream.subscribe()
+    result = asyncio.ensure_future(
+        query_flight.do(key, lambda: answer_prompt(prompt, latency_budget))
+    )
+    try:
+        while not result.done():
+            next_event = asyncio.ensure_future(events.get())
+            await asyncio.wait({next_event, result}, return_when=asyncio.FIRST_COMPLETED)
+            if next_event.done():
+                yield next_event.result()
+            else:
+                next_event.cancel()
+        while not events.empty():
+            yield events.get_nowait()
+
+        record = result.result()
+        if record is not None:
+            yield {"event": "result", "record": record}
+    finally:
+        result.cancel()
+        stream.unsubscribe(events)
+        # Drop a broadcast no run picked up (the flight it joined was ending)
+        if not stream.active and not stream.has_subscribers() and query_streams.get(key) is stream:
+            del query_streams[key]
+
+
+# Background jobs: same work as /api/query, but the client polls for the result
+# instead of holding a connection open for the whole graph run.
+job_runner = JobRunner(
+    engine,
+    handle_query,
+    workers=int(os.getenv("JOB_WORKERS", "2")),
+    max_queued=int(os.getenv("JOB_MAX_QUEUED", "100")),
+    lease=float(os.getenv("JOB_LEASE", "60")),
+)
+
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(prompt: str,
+                     latency_budget: float | None = Query(None, gt=0)):
+    try:
+        job = await job_runner.submit(prompt, latency_budget)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=f"Job queue is full: {e}")
+    return {"job_id": job.id, "status": job.status}
+
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str, session: Session = Depends(get_session)):
+    job = session.get(QueryJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    result = session.get(PromptResult, job.result_id) if job.result_id else None
+    return {
+        **job.model_dump(),
+        "result": result.model_dump() if result else None,
+    }
+
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = await job_runner.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job.id, "status": job.status}
+
+
+class SnapshotNotification(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    snapshot_id: str
+    status: str = "ready"
+
+
+@app.post("/api/snapshots/notify")
+async def snapshot_notify(
+    notification: SnapshotNotification,
+    authorization: str | None = Header(None),
+):
+    """Bright Data `notify` webhook: wakes up the waiting snapshot download."""
+    secret = os.getenv("SNAPSHOT_WEBHOOK_SECRET")
+    if not secret:
+        raise HTTPException(status_code=403, detail="Snapshot webhook is disabled")
+    if not hmac.compare_digest((authorization or "").encode(), secret.encode()):
+        raise HTTPException(status_code=401, detail="Invalid webhook authorization")
+
+    snapshot_poller.notify(notification.snapshot_id, notification.status)
+    return {"status": "ok"}
+
+
+@app.get("/api/search")
+async def search_history(q: str = Query(..., min_length=1),
+                         limit: int = Query(10, ge=1, le=50)):
+    """Ranked full-text search over stored prompts and answers."""
+    if app.state.fulltext:
+        matches = await run_db(fulltext_search, engine, q, limit)
+    else:
+        matches = history_index.search(q, limit)
+
+    records = {r.id: r for r in await run_db(get_prompt_results, [m[0] for m in matches])}
+    return {
+        "query": q,
+        "backend": "sqlserver" if app.state.fulltext else "bm25",
+        "results": [
+            {**records[record_id].model_dump(), "score": round(score, 4)}
+            for record_id, score in matches
+            if record_id in records
+        ],
+    }
+
+
+# Total shown with /api/results; refreshed every RESULTS_COUNT_TTL seconds
+# instead of counting the whole table on every page request.
+result_count = CachedRowCount(PromptResult, ttl=float(os.getenv("RESULTS_COUNT_TTL", "60")))
+
+
+def encode_cursor(record: PromptResult) -> str:
+    raw = json.dumps([record.createdAt.isoformat(), record.id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(record_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 
 @app.get("/api/results")
 def get_results(page: int = Query(1, ge=1),
                 page_size: int = Query(10, ge=1, le=100),
+                cursor: str | None = None,
+                summary: bool = False,
                 session: Session = Depends(get_session)):
-    offset = (page - 1) * page_size
-    
+    """
+    Newest-first history. Pass ``next_cursor`` from the previous response as
+    ``cursor`` to page through it with an index seek; ``page`` (OFFSET) is
+    still accepted and is ignored when a cursor is given.
+
+    ``summary=true`` returns id, prompt, preview and createdAt only, without
+    reading the (possibly compressed) answers; fetch one with /api/results/{id}.
+    """
+    columns = (
+        (PromptResult.id, PromptResult.prompt, PromptResult.preview, PromptResult.createdAt)
+        if summary
+        else (PromptResult,)
+    )
     statement = (
-        select(PromptResult)
-        .order_by(PromptResult.createdAt.desc()) # type: ignore[arg-type]
-        .offset((page - 1) * page_size)
+        select(*columns)  # type: ignore[call-overload]
+        .order_by(PromptResult.createdAt.desc(), PromptResult.id.desc()) # type: ignore[arg-type, union-attr]
         .limit(page_size)
     )
+
+    if cursor:
+        created_at, record_id = decode_cursor(cursor)
+        # Spelled out: SQL Server has no row-value comparison
+        statement = statement.where(or_(
+            PromptResult.createdAt < created_at,  # type: ignore[operator]
+            and_(PromptResult.createdAt == created_at, PromptResult.id < record_id),  # type: ignore[operator]
+        ))
+    else:
+        statement = statement.offset((page - 1) * page_size)
+
     results = session.exec(statement).all()
-    
-    # total count query
-    from sqlalchemy import func
-    total = session.exec(select(func.count()).select_from(PromptResult)).one()
-    
+
+    total = result_count.get(engine)
     total_pages = (total + page_size - 1) // page_size  # integer ceil
 
     return {
-        "results": [r.model_dump() for r in results],
+        "results": [r._asdict() if summary else r.model_dump() for r in results],
         "total": total,
-        "page": page,
+        "page": None if cursor else page,
         "page_size": page_size,
-        "total_pages": total_pages
+        "total_pages": total_pages,
+        "next_cursor": encode_cursor(results[-1]) if len(results) == page_size else None,
     }
 
+
+@app.get("/api/results/{record_id}")
+async def get_result(record_id: int):
+    record = await run_db(get_prompt_result, record_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Result not found")
+    return record.model_dump()
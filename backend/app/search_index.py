@@ -0,0 +1,181 @@
+import re
+import math
+import heapq
+from collections import Counter
+from sqlalchemy import text
+from sqlmodel import Session, select
+from cache import normalize_query
+from db.models import PromptResult
+from db.session import run_db
+
+
+# -----------------------------------------------
+#  Logging helper
+# -----------------------------------------------
+def log(message: str) -> None:
+    print(f"[SEARCH INDEX] {message}")
+
+
+# Han, kana and hangul have no spaces between words; index them per character
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af"
+_TOKEN = re.compile(rf"[{_CJK}]|[^\W{_CJK}]+")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how in is it of on or that the this to was what when where which who why with".split()
+)
+
+
+def tokenize(value: str) -> list[str]:
+    return [t for t in _TOKEN.findall(normalize_query(value)) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-process inverted index over PromptResult prompts and answers.
+
+    Postings map each term to ``{record id: term frequency}``; a query scores
+    only the documents in its terms' postings lists with Okapi BM25 and keeps
+    the top ``limit`` with a heap. Prompt terms count ``prompt_weight`` times
+    so a match on the question outranks a passing mention in an answer.
+    Records are added one at a time, so the index grows with new inserts;
+    tokenizing (``term_counts``) is separate from the postings update
+    (``add_counts``) so bulk loads can tokenize off the event loop.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, prompt_weight: int = 3):
+        self.k1 = k1
+        self.b = b
+        self.prompt_weight = prompt_weight
+
+        self._postings: dict[str, dict[int, int]] = {}
+        self._lengths: dict[int, int] = {}
+        self._total_length = 0
+        self._queries = 0
+        self._last_id = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    @property
+    def last_id(self) -> int:
+        """Highest indexed record id."""
+        return self._last_id
+
+    def term_counts(self, prompt: str, results: str) -> Counter:
+        counts = Counter(tokenize(results))
+        for term in tokenize(prompt):
+            counts[term] += self.prompt_weight
+        return counts
+
+    def add(self, record_id: int, prompt: str, results: str) -> None:
+        self.add_counts(record_id, self.term_counts(prompt, results))
+
+    def add_counts(self, record_id: int, counts: Counter) -> None:
+        if record_id in self._lengths:
+            return
+
+        postings = self._postings
+        for term, frequency in counts.items():
+            entry = postings.get(term)
+            if entry is None:
+                postings[term] = {record_id: frequency}
+            else:
+                entry[record_id] = frequency
+        length = sum(counts.values())
+        self._lengths[record_id] = length
+        self._total_length += length
+        self._last_id = max(self._last_id, record_id)
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[int, float]]:
+        """Top ``(PromptResult.id, score)`` pairs, best first."""
+        self._queries += 1
+        count = len(self._lengths)
+        if count == 0:
+            return []
+
+        average_length = self._total_length / count
+        scores: dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for record_id, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[record_id] / average_length)
+                scores[record_id] = scores.get(record_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    async def build_from_db(self, engine, batch_size: int = 200) -> None:
+        """Index every stored record; loading and tokenizing run on the DB thread pool."""
+        await self.catch_up(engine, 0, batch_size)
+        log(f"Indexed {len(self)} stored results, {len(self._postings)} terms")
+
+    async def catch_up(self, engine, after_id: int, batch_size: int = 200) -> int:
+        """Index stored records with ids above ``after_id``; returns how many were new."""
+        before = len(self)
+        while True:
+            rows = await run_db(self._load_counts, engine, after_id, batch_size)
+            if not rows:
+                break
+            for record_id, counts in rows:
+                self.add_counts(record_id, counts)
+            after_id = rows[-1][0]
+        return len(self) - before
+
+    def _load_counts(self, engine, after_id: int, limit: int) -> list[tuple[int, Counter]]:
+        return [
+            (record_id, self.term_counts(prompt, results))
+            for record_id, prompt, results in _load_records(engine, after_id, limit)
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self._lengths),
+            "terms": len(self._postings),
+            "queries": self._queries,
+        }
+
+
+def _load_records(engine, after_id: int, limit: int) -> list[tuple[int, str, str]]:
+    with Session(engine) as session:
+        statement = (
+            select(PromptResult.id, PromptResult.prompt, PromptResult.results)
+            .where(PromptResult.id > after_id)  # type: ignore[operator]
+            .order_by(PromptResult.id)  # type: ignore[arg-type]
+            .limit(limit)
+        )
+        return list(session.exec(statement).all())  # type: ignore[arg-type]
+
+
+# SQL Server full-text search, used instead of the in-process index when
+# PromptResult has a full-text index (see create_table.sql).
+def has_fulltext_index(engine) -> bool:
+    if engine.dialect.name != "mssql":
+        return False
+    try:
+        with engine.connect() as conn:
+            enabled = conn.execute(text(
+                "SELECT OBJECTPROPERTY(OBJECT_ID('PromptResult'), 'TableHasActiveFulltextIndex')"
+            )).scalar()
+    except Exception as e:
+        log(f"Full-text check failed: {e}")
+        return False
+    return enabled == 1
+
+
+def fulltext_search(engine, query: str, limit: int = 10) -> list[tuple[int, float]]:
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT ft.[KEY], ft.[RANK] "
+                "FROM FREETEXTTABLE(PromptResult, (prompt, results), :query, :limit) AS ft "
+                "ORDER BY ft.[RANK] DESC"
+            ),
+            {"query": query, "limit": limit},
+        ).all()
+    return [(int(key), float(rank)) for key, rank in rows]
+
+
+history_index = BM25Index()
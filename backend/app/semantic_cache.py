@@ -0,0 +1,214 @@
+import os
+import re
+import hashlib
+from typing import Protocol
+import numpy as np
+from dotenv import load_dotenv, find_dotenv
+from sqlmodel import Session, select
+import clients
+from cache import normalize_query
+from db.models import PromptResult
+from db.session import run_db
+from limits import get_limiter
+
+load_dotenv(find_dotenv(usecwd=True))
+
+
+# -----------------------------------------------
+#  Logging helper
+# -----------------------------------------------
+def log(message: str) -> None:
+    print(f"[SEMANTIC CACHE] {message}")
+
+
+class Embedder(Protocol):
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        """Return one embedding row per text (shape: len(texts) x dim)."""
+        ...
+
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder: signed feature hashing of word unigrams and
+    bigrams. No network, no model download; good enough to catch reworded
+    duplicates and stable across processes, which makes it usable in tests.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = re.findall(r"\w+", normalize_query(text))
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vectors[row, bucket] += sign
+        return vectors
+
+
+class OpenAIEmbedder:
+    def __init__(self, model: str = "text-embedding-3-small"):
+        from langchain_openai import OpenAIEmbeddings
+
+        self._embeddings = OpenAIEmbeddings(
+            model=model,
+            api_key=os.getenv("OPENAI_API_KEY"),  # type: ignore[arg-type]
+            http_async_client=clients.llm_client,
+        )
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        async with get_limiter("openai"):
+            vectors = await self._embeddings.aembed_documents(texts)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class SemanticIndex:
+    """
+    Embedding index over past prompts for answer reuse.
+
+    Rows are L2-normalized and stored in one float32 matrix, so a lookup is a
+    single matrix-vector product (cosine similarity against every stored
+    prompt) followed by a partial sort for the top ``k``.
+    """
+
+    def __init__(self, embedder: Embedder, threshold: float = 0.95, top_k: int = 3):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.top_k = top_k
+
+        self._matrix: np.ndarray | None = None
+        self._ids: list[int] = []
+        self._indexed: set[int] = set()
+        self._last_id = 0
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def last_id(self) -> int:
+        """Highest indexed ``PromptResult.id``."""
+        return self._last_id
+
+    async def add(self, ids: list[int], prompts: list[str]) -> None:
+        new = [(i, p) for i, p in zip(ids, prompts) if i not in self._indexed]
+        if not new:
+            return
+
+        vectors = _normalize_rows(await self.embedder.embed([p for _, p in new]))
+
+        # A concurrent add (e.g. the startup build) may have indexed some of
+        # these rows while the embedding call was in flight
+        keep = [n for n, (record_id, _) in enumerate(new) if record_id not in self._indexed]
+        if not keep:
+            return
+        self._append(vectors[keep])
+        for n in keep:
+            self._ids.append(new[n][0])
+            self._indexed.add(new[n][0])
+            self._last_id = max(self._last_id, new[n][0])
+
+    async def search(self, prompt: str) -> list[tuple[int, float]]:
+        """Top-k ``(PromptResult.id, similarity)`` pairs at or above the threshold."""
+        count = len(self._ids)
+        if count == 0:
+            return []
+
+        query = _normalize_rows(await self.embedder.embed([prompt]))[0]
+        scores = self._matrix[:count] @ query  # type: ignore[index]
+
+        k = min(self.top_k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            (self._ids[i], float(scores[i])) for i in top if scores[i] >= self.threshold
+        ]
+
+    async def lookup(self, prompt: str) -> tuple[int, float] | None:
+        """Best match above the threshold, if any; counted in ``stats()``."""
+        matches = await self.search(prompt)
+        if matches:
+            self._hits += 1
+            return matches[0]
+        self._misses += 1
+        return None
+
+    async def build_from_db(self, engine, batch_size: int = 256) -> None:
+        """Index every stored prompt, ``batch_size`` rows per DB round-trip and embedding call."""
+        await self.catch_up(engine, 0, batch_size)
+        log(f"Indexed {len(self)} stored prompts")
+
+    async def catch_up(self, engine, after_id: int, batch_size: int = 256) -> int:
+        """Index stored prompts with ids above ``after_id``; returns how many were new."""
+        before = len(self)
+        while True:
+            rows = await run_db(_load_prompts, engine, after_id, batch_size)
+            if not rows:
+                break
+            await self.add([r[0] for r in rows], [r[1] for r in rows])
+            after_id = rows[-1][0]
+        return len(self) - before
+
+    def stats(self) -> dict:
+        return {
+            "indexed": len(self._ids),
+            "hits": self._hits,
+            "misses": self._misses,
+            "threshold": self.threshold,
+        }
+
+    def _append(self, vectors: np.ndarray) -> None:
+        count = len(self._ids)
+        needed = count + len(vectors)
+
+        if self._matrix is None:
+            self._matrix = np.empty((max(needed, 1024), vectors.shape[1]), dtype=np.float32)
+        elif needed > len(self._matrix):
+            # Grow geometrically so repeated single inserts stay amortized O(1)
+            grown = np.empty((max(needed, 2 * len(self._matrix)), self._matrix.shape[1]), dtype=np.float32)
+            grown[:count] = self._matrix[:count]
+            self._matrix = grown
+
+        self._matrix[count:needed] = vectors
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _load_prompts(engine, after_id: int, limit: int) -> list[tuple[int, str]]:
+    with Session(engine) as session:
+        statement = (
+            select(PromptResult.id, PromptResult.prompt)
+            .where(PromptResult.id > after_id)  # type: ignore[operator]
+            .where(PromptResult.sources_skipped.is_(None))  # type: ignore[union-attr]
+            .order_by(PromptResult.id)  # type: ignore[arg-type]
+            .limit(limit)
+        )
+        return list(session.exec(statement).all())  # type: ignore[arg-type]
+
+
+def create_embedder(name: str) -> Embedder:
+    if name == "hashing":
+        return HashingEmbedder()
+    return OpenAIEmbedder(os.getenv("SEMANTIC_CACHE_MODEL", "text-embedding-3-small"))
+
+
+# SEMANTIC_CACHE: "openai" (default), "hashing" (local, deterministic) or "off"
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "openai")
+
+semantic_index: SemanticIndex | None = (
+    None
+    if SEMANTIC_CACHE == "off"
+    else SemanticIndex(
+        create_embedder(SEMANTIC_CACHE),
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+        top_k=int(os.getenv("SEMANTIC_CACHE_TOP_K", "3")),
+    )
+)
@@ -0,0 +1,88 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict
+
+
+@dataclass
+class _Call:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key (the leader) starts ``fn`` as a task; callers
+    arriving while it runs await the same task instead of starting their own.
+    A caller that is cancelled only stops waiting: the shared work keeps
+    running for the others and is cancelled only when nobody waits any more.
+    Results are not cached once the call completes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self._leaders = 0
+        self._coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(task=asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self._leaders += 1
+        else:
+            self._coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "leaders": self._leaders,
+            "coalesced": self._coalesced,
+            "in_flight": len(self._calls),
+        }
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+class EventBroadcast:
+    """
+    Progress events of one in-flight call, fanned out to every subscriber.
+
+    A subscriber gets a queue that first replays the events published so
+    far, so one that joins a running call late still sees all of it.
+    """
+
+    def __init__(self):
+        self.active = False
+        self._events: list[Any] = []
+        self._queues: set[asyncio.Queue] = set()
+
+    def publish(self, event: Any) -> None:
+        self._events.append(event)
+        for queue in self._queues:
+            queue.put_nowait(event)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self._events:
+            queue.put_nowait(event)
+        self._queues.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._queues.discard(queue)
+
+    def has_subscribers(self) -> bool:
+        return bool(self._queues)
@@ -27,6 +27,8 @@ import {
   Pagination,
   CircularProgress,
   IconButton,
+  Chip,
+  Stack,
 } from "@mui/material";
 
 import SendIcon from "@mui/icons-material/Send"; // arrow icon
@@ -44,14 +46,62 @@ function App() {
   const [isLoading, setLoading] = useState(false);
   const [page, setPage] = useState(1);
   const [totalPages, setTotalPages] = useState(0);
+  const [isStreaming, setStreaming] = useState(false);
+  const [progress, setProgress] = useState({}); // source -> { node, status, elapsed }
+  const [answer, setAnswer] = useState("");
 
-  const submitPrompt = async () => {
-    setLoading(true);
-    const res = await axios.post(`${url}/api/query`, null, {
-      params: { prompt },
+  // Streams node progress and answer tokens from /api/query/stream (SSE)
+  const submitPrompt = () => {
+    setStreaming(true);
+    setProgress({});
+    setAnswer("");
+
+    const events = new EventSource(
+      `${url}/api/query/stream?prompt=${encodeURIComponent(prompt)}`
+    );
+    const finish = () => {
+      events.close();
+      setStreaming(false);
+    };
+
+    const onNode = (status) => (e) => {
+      const data = JSON.parse(e.data);
+      if (!data.source) return;
+      setProgress((p) => ({
+        ...p,
+        [data.source]: {
+          node: data.node,
+          status: data.error ? "failed" : status,
+          elapsed: data.elapsed,
+        },
+      }));
+    };
+    events.addEventListener("node_start", onNode("running"));
+    events.addEventListener("node_end", (e) => {
+      // A source is done when its analysis finishes; other nodes just advance it
+      const data = JSON.parse(e.data);
+      onNode(data.done ? "done" : "running")(e);
     });
-    setResults([res.data, ...results]);
-    setLoading(false);
+    events.addEventListener("token", (e) => {
+      const data = JSON.parse(e.data);
+      setAnswer((a) => a + data.content);
+    });
+    events.addEventListener("result", (e) => {
+      const data = JSON.parse(e.data);
+      setResults((r) => [data, ...r]);
+    });
+    events.addEventListener("done", finish);
+    // Fired both for a server "error" event and for a dropped connection
+    events.addEventListener("error", (e) => {
+      if (e.data) console.error(JSON.parse(e.data).detail);
+      finish();
+    });
+  };
+
+  // Listings carry only a preview; the full answer is fetched on first expand
+  const loadResult = async (id) => {
+    const res = await axios.get(`${url}/api/results/${id}`);
+    setResults((rs) => rs.map((r) => (r.id === id ? res.data : r)));
   };
 
   const pageSize = 5;
@@ -61,7 +111,7 @@ function App() {
       setLoading(true);
       try {
         const res = await axios.get(`${url}/api/results`, {
-          params: { page, page_size: pageSize }, // backend expects 1-based
+          params: { page, page_size: pageSize, summary: true }, // backend expects 1-based
         });
         setResults(res.data.results);
         setTotalPages(res.data.total_pages);
@@ -128,16 +178,50 @@ function App() {
             justifyContent: "flex-end",
           }}
           onClick={submitPrompt}
-          disabled={isLoading}
+          disabled={isLoading || isStreaming}
         >
           <SendIcon />
         </IconButton>
       </Box>
 
+      {isStreaming ? (
+        <Card sx={{ mt: 3 }}>
+          <CardContent>
+            <Stack direction="row" spacing={1} sx={{ flexWrap: "wrap" }}>
+              {Object.entries(progress).map(([source, p]) => (
+                <Chip
+                  key={source}
+                  size="small"
+                  label={`${source}: ${p.status === "running" ? p.node : p.status} · ${p.elapsed.toFixed(1)}s`}
+                  color={
+                    p.status === "done"
+                      ? "success"
+                      : p.status === "failed"
+                      ? "error"
+                      : "default"
+                  }
+                />
+              ))}
+            </Stack>
+            {answer ? (
+              <ReactMarkdown remarkPlugins={[remarkGfm]}>{answer}</ReactMarkdown>
+            ) : (
+              <CircularProgress size={24} sx={{ mt: 2 }} />
+            )}
+          </CardContent>
+        </Card>
+      ) : (
+        ""
+      )}
+
       {results.map((r) => (
         <Card key={r.id} sx={{ mt: 3 }}>
           <CardContent>
-            <Accordion>
+            <Accordion
+              onChange={(e, expanded) => {
+                if (expanded && r.results === undefined) loadResult(r.id);
+              }}
+            >
               <AccordionSummary expandIcon={<ExpandMoreIcon />}>
                 <Typography sx={{ fontWeight: "bold", color: "green" }}>
                   {r.prompt}
@@ -155,7 +239,7 @@ function App() {
               </AccordionSummary>
               <AccordionDetails>
                 <ReactMarkdown remarkPlugins={[remarkGfm]}>
-                  {r.results}
+                  {r.results ?? r.preview}
                 </ReactMarkdown>
               </AccordionDetails>
             </Accordion>